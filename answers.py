@@ -0,0 +1,115 @@
+"""
+答案空间：预先算好所有合法的 (底数, 真数, 答案) 组合，出题时按权重成批抽取
+除 main.gen_ans 的正整数答案外，还覆盖负指数和分数指数，如 log_4 8 = 3/2、log_2 (1/8) = -3
+"""
+from fractions import Fraction
+from itertools import accumulate
+from random import Random
+from typing import Callable, Sequence
+import hashlib
+import chaos
+import exact
+import expr
+import tables
+import verify
+from verify import exact_matches
+
+Answer = int | Fraction
+
+BASES = (2, 3, 4, 5, 8, 9, 10, 16, 25, 27, 'e')
+EXPONENTS = (-3, -2, -1, 1, 2, 3, 4, Fraction(1, 2), Fraction(3, 2), Fraction(1, 3), Fraction(2, 3),
+             Fraction(-1, 2), Fraction(4, 3))
+MAX_ARG = 10 ** 6  # 真数的分子分母的上限
+
+
+def _int_root(n: int, q: int) -> int | None:
+    """n 的 q 次方根，不是整数时返回 None"""
+    r = round(n ** (1 / q))
+    for c in (r - 1, r, r + 1):
+        if c > 0 and c ** q == n:
+            return c
+    return None
+
+
+def _number(interner: expr.Interner, x: Fraction) -> expr.Node:
+    """有理数节点，非整数时为 \\frac{p}{q}"""
+    if x.denominator == 1:
+        return interner.value(x.numerator)
+    return interner.op(expr.Div, interner.value(x.numerator), interner.value(x.denominator))
+
+
+def _argument(interner: expr.Interner, base: int | str, k: Fraction) -> expr.Node | None:
+    """值为 base^k 的真数节点，不能写成有理数（底数为 e 时为 e 的有理数次幂）时返回 None"""
+    if base == "e":
+        e = interner.value("e")
+        return e if k == 1 else interner.op(expr.Pow, e, _number(interner, k))
+    root = _int_root(base, k.denominator)
+    if root is None:
+        return None
+    arg = Fraction(root) ** k.numerator
+    if max(arg.numerator, arg.denominator) > MAX_ARG:
+        return None
+    return _number(interner, arg)
+
+
+def _enumerate(bases: tuple, exponents: tuple) -> list[tuple[int | str, expr.Node, Answer]]:
+    """枚举并精确核对 bases × exponents 中的合法组合 [(底数, 题目, 答案), ...]"""
+    interner = expr.Interner()
+    table = []
+    for base in bases:
+        for k in map(Fraction, exponents):
+            arg = _argument(interner, base, k)
+            if arg is None:
+                continue
+            ans = k.numerator if k.denominator == 1 else k
+            node = interner.op(expr.Log, interner.value(base), arg)
+            if not exact_matches(node, ans):
+                raise ValueError(f"Answer table entry failed verification: {node} != {ans}")
+            table.append((base, node, ans))
+    return table
+
+
+def _table_name(bases: tuple, exponents: tuple) -> str:
+    """缓存文件名，不同的 bases 和 exponents 各有一个缓存"""
+    return "answers-" + hashlib.blake2b(repr((bases, exponents)).encode(), digest_size=8).hexdigest()
+
+
+class AnswerSpace:
+    """
+    答案的取值空间，构造时枚举 bases × exponents 中真数能写成有理数的组合并逐一精确核对，
+    核对过的表缓存在磁盘上（见 tables.py），之后的进程直接载入
+    bases 须为不小于 2 的整数或 "e"，exponents 须为整数或 Fraction，否则抛出 ValueError
+    weight: 若给出，weight(底数, 答案) 为各组合被抽中的相对权重，权重为 0 的组合不会出现
+    table 中的题目节点已冻结，抽出后直接交给 make_chaos（写时复制）使用，不必每次重建
+    """
+
+    def __init__(self, bases: Sequence[int | str] = BASES, exponents: Sequence[Answer] = EXPONENTS,
+                 weight: Callable[[int | str, Answer], float] | None = None):
+        bases, exponents = tuple(bases), tuple(exponents)
+        for base in bases:
+            if base != "e" and (not isinstance(base, int) or base < 2):
+                raise ValueError(f"Invalid base: {base!r}")
+        for k in exponents:
+            if isinstance(k, bool) or not isinstance(k, (int, Fraction)):
+                raise ValueError(f"Invalid exponent: {k!r}")
+        key = (tables.sources_key(__file__, expr.__file__, exact.__file__, verify.__file__), bases, exponents)
+        self.table: list[tuple[expr.Node, Answer]] = []
+        weights: list[float] = []
+        for base, node, ans in tables.cached(_table_name(bases, exponents), key,
+                                             lambda: _enumerate(bases, exponents)):
+            w = 1.0 if weight is None else weight(base, ans)
+            if w > 0:
+                self.table.append((node, ans))
+                weights.append(w)
+        if not self.table:
+            raise ValueError("Empty answer space")
+        self._cum_weights = list(accumulate(weights))
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def sample(self, rng: Random | None = None, k: int = 1) -> list[tuple[expr.Node, Answer]]:
+        """按权重有放回地抽取 k 个 (题目, 答案)"""
+        if rng is None:
+            rng = chaos.default_rng
+        return rng.choices(self.table, cum_weights=self._cum_weights, k=k)
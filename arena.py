@@ -0,0 +1,239 @@
+"""紧凑的表达式池：把大量表达式树存放在几个并行的 array 中"""
+from array import array
+from typing import Iterable, Iterator
+import expr
+
+# 操作码
+OP_INT = 0      # 整数，数值存放在 lhs 中
+OP_FLOAT = 1    # 小数，lhs 为其在 floats 中的下标
+OP_BIG_INT = 2  # 超出 lhs 范围的整数，lhs 为其在 big_ints 中的下标
+OP_E = 3
+OP_PI = 4
+OP_ADD = 5
+OP_SUB = 6
+OP_MUL = 7
+OP_DIV = 8
+OP_POW = 9
+OP_LOG = 10
+
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1  # array("q") 能存放的整数范围
+
+_OPS: dict[type, int] = {
+    expr.Add: OP_ADD,
+    expr.Sub: OP_SUB,
+    expr.Mul: OP_MUL,
+    expr.Div: OP_DIV,
+    expr.Pow: OP_POW,
+    expr.Log: OP_LOG,
+}
+_CLASSES: dict[int, type] = {op: cls for cls, op in _OPS.items()}
+_SYMBOLS = {"e": OP_E, "pi": OP_PI}
+
+
+class Arena:
+    """
+    表达式池，节点按后序追加，子节点的下标总是小于父节点
+    ops[i]: 第 i 个节点的操作码
+    lhs[i], rhs[i]: 运算节点的左右子节点下标；叶子节点的含义见操作码
+    roots[k]: 第 k 棵树的根节点下标
+    floats、big_ints: 放不进 lhs 的叶子数值
+    """
+    __slots__ = ("ops", "lhs", "rhs", "floats", "big_ints", "roots")
+
+    def __init__(self, nodes: Iterable[expr.Node] = ()):
+        self.ops = array("B")
+        self.lhs = array("q")
+        self.rhs = array("q")
+        self.floats = array("d")
+        self.big_ints: list[int] = []
+        self.roots = array("q")
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self) -> int:
+        """树的数量"""
+        return len(self.roots)
+
+    def __iter__(self) -> Iterator[expr.Node]:
+        for k in range(len(self.roots)):
+            yield self.view(k)
+
+    def nbytes(self) -> int:
+        """各个缓冲区占用的字节数，不含 big_ints 中的整数对象"""
+        return sum(a.itemsize * len(a) for a in (self.ops, self.lhs, self.rhs, self.floats, self.roots))
+
+    def _push(self, op: int, lhs: int, rhs: int) -> int:
+        self.ops.append(op)
+        self.lhs.append(lhs)
+        self.rhs.append(rhs)
+        return len(self.ops) - 1
+
+    def _push_value(self, value: int | float | str) -> int:
+        if isinstance(value, str):
+            if value not in _SYMBOLS:
+                raise ValueError(f"Unknown value: {value}")
+            return self._push(_SYMBOLS[value], 0, 0)
+        if isinstance(value, int):
+            if _INT_MIN <= value <= _INT_MAX:
+                return self._push(OP_INT, value, 0)
+            self.big_ints.append(value)
+            return self._push(OP_BIG_INT, len(self.big_ints) - 1, 0)
+        self.floats.append(value)
+        return self._push(OP_FLOAT, len(self.floats) - 1, 0)
+
+    def add(self, node: expr.Node) -> int:
+        """追加一棵树，返回它的编号；树内共享的子节点在池中也只存一份"""
+        index: dict[int, int] = {}  # id(节点) -> 池中下标
+        stack: list[tuple[expr.Node, bool]] = [(node, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if id(n) in index:
+                continue
+            if isinstance(n, expr.Value):
+                index[id(n)] = self._push_value(n.value)
+            elif not expanded:
+                stack.append((n, True))
+                stack.append((n.right, False))
+                stack.append((n.left, False))
+            else:
+                index[id(n)] = self._push(_OPS[n.base_type], index[id(n.left)], index[id(n.right)])
+        self.roots.append(index[id(node)])
+        return len(self.roots) - 1
+
+    def value(self, i: int) -> int | float | str:
+        """叶子节点 i 的数值"""
+        op = self.ops[i]
+        if op == OP_INT:
+            return self.lhs[i]
+        elif op == OP_FLOAT:
+            return self.floats[self.lhs[i]]
+        elif op == OP_BIG_INT:
+            return self.big_ints[self.lhs[i]]
+        elif op == OP_E:
+            return "e"
+        elif op == OP_PI:
+            return "pi"
+        raise ValueError(f"Node {i} is not a value")
+
+    def node(self, i: int) -> expr.Node:
+        """节点 i 的只读视图"""
+        return _VIEWS[self.ops[i]](self, i)
+
+    def view(self, k: int) -> expr.Node:
+        """第 k 棵树的只读视图，支持 calc()、str() 和 metrics()"""
+        return self.node(self.roots[k])
+
+    def to_node(self, k: int) -> expr.Node:
+        """把第 k 棵树还原为普通的 expr 节点，共享关系保持不变"""
+        reachable = set()
+        stack = [self.roots[k]]
+        while stack:
+            i = stack.pop()
+            if i in reachable:
+                continue
+            reachable.add(i)
+            if self.ops[i] >= OP_ADD:
+                stack.append(self.lhs[i])
+                stack.append(self.rhs[i])
+
+        built: dict[int, expr.Node] = {}
+        for i in sorted(reachable):  # 子节点下标更小，先被构建
+            op = self.ops[i]
+            if op < OP_ADD:
+                built[i] = expr.Value(self.value(i))
+            else:
+                built[i] = _CLASSES[op](built[self.lhs[i]], built[self.rhs[i]])
+        return built[self.roots[k]]
+
+
+class NodeView:
+    """池中节点的只读视图，计算和渲染沿用对应 expr 类的实现"""
+    __slots__ = ()
+
+    _arena: Arena
+    _index: int
+
+    def __init__(self, arena: Arena, index: int):
+        self._arena = arena
+        self._index = index
+        self._frozen = True
+        self.invalidate()
+
+
+class ValueView(NodeView, expr.Value):
+    __slots__ = ("_arena", "_index")
+    prio = 100
+
+    @property
+    def value(self) -> int | float | str:
+        return self._arena.value(self._index)
+
+
+class _BinOpView(NodeView):
+    """子节点的视图在首次访问时创建并保留，子树的缓存因此能被父节点复用"""
+    __slots__ = ()
+
+    _children: tuple[expr.Node, expr.Node] | None
+
+    def __init__(self, arena: Arena, index: int):
+        self._children = None
+        super().__init__(arena, index)
+
+    def _views(self) -> tuple[expr.Node, expr.Node]:
+        if self._children is None:
+            arena = self._arena
+            self._children = (arena.node(arena.lhs[self._index]), arena.node(arena.rhs[self._index]))
+        return self._children
+
+    @property
+    def left(self) -> expr.Node:
+        return self._views()[0]
+
+    @property
+    def right(self) -> expr.Node:
+        return self._views()[1]
+
+
+class AddView(_BinOpView, expr.Add):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 1
+
+
+class SubView(_BinOpView, expr.Sub):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 1
+
+
+class MulView(_BinOpView, expr.Mul):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 2
+
+
+class DivView(_BinOpView, expr.Div):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 2
+
+
+class PowView(_BinOpView, expr.Pow):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 4
+
+
+class LogView(_BinOpView, expr.Log):
+    __slots__ = ("_arena", "_index", "_children")
+    prio = 3
+
+
+_VIEWS: dict[int, type] = {
+    OP_INT: ValueView,
+    OP_FLOAT: ValueView,
+    OP_BIG_INT: ValueView,
+    OP_E: ValueView,
+    OP_PI: ValueView,
+    OP_ADD: AddView,
+    OP_SUB: SubView,
+    OP_MUL: MulView,
+    OP_DIV: DivView,
+    OP_POW: PowView,
+    OP_LOG: LogView,
+}
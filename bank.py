@@ -0,0 +1,190 @@
+"""
+题库：离线批量生成题目存入紧凑的二进制文件，出卷时内存映射后按难度区间抽取
+
+文件结构（小端）：
+    文件头    HEADER
+    记录区    每道题依次为 codec 格式的表达式树和 UTF-8 编码的 Latex 表达式
+    难度列    count 个 u32，即各题 Latex 表达式的长度，升序排列
+    索引      count 个 ENTRY，顺序与难度列一致
+"""
+from array import array
+from fractions import Fraction
+from mmap import ACCESS_READ, mmap
+from random import Random
+from typing import Container, NamedTuple
+import bisect
+import os
+import random
+import struct
+import sys
+import chaos
+import codec
+from dedup import DedupIndex, canonical_key
+import expr
+import main
+import parallel
+from verify import Verifier
+
+MAGIC = b"LOGBANK\0"
+VERSION = 2  # 版本 2 起表达式树使用 codec 格式
+HEADER = struct.Struct("<8sIIQQQ")  # 魔数, 版本, 保留, 题目数, 难度列位置, 索引位置
+ENTRY = struct.Struct("<16sQIIqqIHHH")  # 判重键, 记录位置, 树长度, Latex 长度, 答案分子, 答案分母,
+#                                         节点数, 深度, 对数个数, 换底次数
+
+class Record(NamedTuple):
+    """题库中的一道题"""
+    latex: str
+    answer: int | Fraction
+    metrics: expr.Metrics
+    key: bytes      # 判重键，见 dedup.canonical_key
+    tree: bytes     # codec 格式的表达式树，见 node()
+
+    def node(self) -> expr.Node:
+        return codec.loads(self.tree)
+
+
+def _build_chunk(seed: int, size: int, verify: bool,
+                 band: tuple[int, int] | None) -> list[tuple[bytes, bytes, bytes, int, expr.Metrics]]:
+    """在子进程中生成一块题目，返回 [(判重键, 树, Latex, 答案, 指标), ...]"""
+    records = []
+    for node, ans in main.gen_problems(size, Verifier() if verify else None, random.Random(seed)):
+        m = node.metrics()
+        if band is None or band[0] <= m.latex_len < band[1]:
+            records.append((canonical_key(node), codec.dumps(node), str(node).encode(), ans, m))
+    return records
+
+
+def build(path: str, count: int, seed: int | None = None, workers: int = 1, verify: bool = True,
+          band: tuple[int, int] | None = None, limit: int | None = None) -> int:
+    """
+    生成 count 道互不重复的题目写入题库文件 path，同一个 seed 得到的文件与 workers 无关
+    band: 若给出，只收录难度落在 [lo, hi) 内的题目
+    limit: 最多生成的块数，默认为 count 的 10 倍题目所需的块数
+    返回: 实际收录的题目数，生成的块数用完时可能少于 count
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    if limit is None:
+        limit = -(-count * 10 // parallel.CHUNK)
+
+    seen = DedupIndex()
+    keys = array("I")       # 各题的难度，按写入顺序
+    entries = bytearray()   # 各题的索引项，同上
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        offset = HEADER.size
+        done = 0
+        wanted = lambda: parallel.needed_chunks(count - len(keys), len(keys), done)
+        for chunk in parallel.iter_chunks(_build_chunk, seed, (parallel.CHUNK, verify, band), workers, limit, wanted):
+            done += 1
+            for key, tree, latex, ans, m in chunk:
+                if len(keys) >= count or not seen.add(key):
+                    continue
+                ans = Fraction(ans)
+                f.write(tree)
+                f.write(latex)
+                entries += ENTRY.pack(key, offset, len(tree), len(latex), ans.numerator, ans.denominator,
+                                      m.nodes, m.depth, m.logs, m.base_changes)
+                keys.append(m.latex_len)
+                offset += len(tree) + len(latex)
+            if len(keys) >= count:
+                break
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)  # 稳定排序，同难度保持生成顺序
+        keys_offset = -(-offset // 8) * 8
+        f.write(bytes(keys_offset - offset))
+        f.write(array("I", (keys[i] for i in order)).tobytes())
+        index_offset = keys_offset + keys.itemsize * len(keys)
+        view = memoryview(entries)
+        for i in order:
+            f.write(view[i * ENTRY.size:(i + 1) * ENTRY.size])
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(keys), keys_offset, index_offset))
+    os.replace(tmp, path)
+    return len(keys)
+
+
+class Bank:
+    """
+    只读地内存映射一个题库文件，打开和抽题都不需要读入整个文件
+    题目按难度升序编号，一个难度区间对应一段连续的编号
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        magic, version, _, self._count, keys_offset, self._index_offset = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"Not a problem bank: {path}")
+        if version != VERSION:
+            self._mm.close()
+            raise ValueError(f"Unsupported bank version {version} (expected {VERSION}): {path}")
+        self._keys = memoryview(self._mm)[keys_offset:keys_offset + 4 * self._count].cast("I")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        if not self._mm.closed:
+            self._keys.release()
+            self._mm.close()
+
+    def __enter__(self) -> "Bank":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def band(self, band: tuple[int, int]) -> range:
+        """难度落在 [lo, hi) 内的题目编号，二分查找"""
+        return range(bisect.bisect_left(self._keys, band[0]), bisect.bisect_left(self._keys, band[1]))
+
+    def key(self, i: int) -> bytes:
+        """第 i 道题的判重键，不解码整条记录"""
+        start = self._index_offset + i * ENTRY.size
+        return self._mm[start:start + 16]
+
+    def record(self, i: int) -> Record:
+        """第 i 道题"""
+        key, offset, tree_len, latex_len, num, den, nodes, depth, logs, base_changes = \
+            ENTRY.unpack_from(self._mm, self._index_offset + i * ENTRY.size)
+        text_offset = offset + tree_len
+        return Record(
+            latex=self._mm[text_offset:text_offset + latex_len].decode(),
+            answer=num if den == 1 else Fraction(num, den),
+            metrics=expr.Metrics(nodes, depth, logs, base_changes, self._keys[i]),
+            key=key,
+            tree=self._mm[offset:text_offset],
+        )
+
+    def sample(self, count: int, band: tuple[int, int], rng: Random | None = None,
+               exclude: Container[bytes] = ()) -> list[Record]:
+        """
+        从难度区间 band 中随机抽取 count 道题，按难度升序排列
+        exclude: 跳过判重键在其中的题目，如之前发放过题目的 DedupIndex
+        """
+        if rng is None:
+            rng = chaos.default_rng
+        ids = self.band(band)
+        picked: set[int] = set()
+        # 先多抽一些，被排除的题目不多时一次就够；不够再遍历整个区间的随机排列
+        for size in (min(len(ids), 2 * count + 16), len(ids)):
+            for i in rng.sample(ids, size):
+                if len(picked) >= count:
+                    break
+                if i not in picked and self.key(i) not in exclude:
+                    picked.add(i)
+            if len(picked) >= count or size == len(ids):
+                break
+        if len(picked) < count:
+            raise RuntimeError(f"Only {len(picked)} of {count} problems in the band {band} are available")
+        return [self.record(i) for i in sorted(picked)]
+
+
+if __name__ == "__main__":
+    # 用法: python bank.py 题库文件 题目数 [进程数]
+    path, total = sys.argv[1], int(sys.argv[2])
+    print(build(path, total, workers=int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1))
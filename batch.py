@@ -0,0 +1,149 @@
+"""批量求值：把大量表达式树编译为后缀程序，用 NumPy 一次性计算"""
+from typing import NamedTuple, Sequence
+import numpy as np
+import expr
+
+# 后缀程序的指令
+PUSH = 0    # 压入常数
+ADD = 1
+SUB = 2
+MUL = 3
+DIV = 4
+POW = 5
+LOG = 6     # 栈顶为真数，次栈顶为底数
+NOP = 7     # 程序结束后的填充
+
+_OPS: dict[type, int] = {
+    expr.Add: ADD,
+    expr.Sub: SUB,
+    expr.Mul: MUL,
+    expr.Div: DIV,
+    expr.Pow: POW,
+    expr.Log: LOG,
+}
+
+
+class Program(NamedTuple):
+    """若干棵树的后缀程序，每行对应一棵树，不足部分用 NOP 补齐"""
+    ops: np.ndarray      # (树数, 程序长度) uint8
+    consts: np.ndarray   # (树数, 程序长度) float64，PUSH 指令压入的数
+    depth: int           # 所需的最大栈深度
+
+
+def _postfix(node: expr.Node) -> tuple[list[int], list[float], int]:
+    """把一棵树展开成后缀指令，共享的子树会被重复展开"""
+    ops: list[int] = []
+    consts: list[float] = []
+    sp = depth = 0
+    stack: list[tuple[expr.Node, bool]] = [(node, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if isinstance(n, expr.Value):
+            ops.append(PUSH)
+            consts.append(n.calc())
+            sp += 1
+            depth = max(depth, sp)
+        elif not expanded:
+            stack.append((n, True))
+            stack.append((n.right, False))
+            stack.append((n.left, False))
+        else:
+            ops.append(_OPS[n.base_type])
+            consts.append(0.0)
+            sp -= 1
+    return ops, consts, depth
+
+
+def compile_program(nodes: Sequence[expr.Node]) -> Program:
+    """把一批树编译为一个 Program"""
+    compiled = [_postfix(node) for node in nodes]
+    length = max((len(ops) for ops, _, _ in compiled), default=0)
+    prog_ops = np.full((len(compiled), length), NOP, dtype=np.uint8)
+    prog_consts = np.zeros((len(compiled), length), dtype=np.float64)
+    for i, (ops, consts, _) in enumerate(compiled):
+        prog_ops[i, :len(ops)] = ops
+        prog_consts[i, :len(consts)] = consts
+    return Program(prog_ops, prog_consts, max((d for _, _, d in compiled), default=0))
+
+
+def _apply(op: int, a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """对一组操作数执行同一条指令，返回结果和定义域错误掩码，规则与 Node.calc() 一致"""
+    if op == ADD:
+        return a + b, np.zeros(a.shape, dtype=bool)
+    elif op == SUB:
+        return a - b, np.zeros(a.shape, dtype=bool)
+    elif op == MUL:
+        return a * b, np.zeros(a.shape, dtype=bool)
+    elif op == DIV:
+        return a / b, b == 0
+    elif op == POW:
+        # 负数的非整数次幂在 Python 中得到复数，0 的负数次幂抛出 ZeroDivisionError
+        bad = ((a < 0) & (b != np.floor(b))) | ((a == 0) & (b < 0))
+        return np.power(a, b), bad
+    else:  # LOG
+        bad = (a <= 0) | (b <= 0) | (a == 1)
+        return np.log(b) / np.log(a), bad
+
+
+def evaluate(program: Program) -> tuple[np.ndarray, np.ndarray]:
+    """
+    同时执行 program 中的所有程序
+    每条指令之后都检查结果：中间结果溢出或为 nan 时记为错误，与 Node.calc() 中乘方溢出抛出
+    OverflowError、verify.safe_value 返回 None 一致，不会因为后续运算（如 1 除以溢出的数）而被掩盖
+    返回: (结果向量, 错误掩码)，出错的树结果为 nan
+    """
+    n, length = program.ops.shape
+    stack = np.zeros((n, max(program.depth, 1)), dtype=np.float64)
+    sp = np.zeros(n, dtype=np.intp)
+    errors = np.zeros(n, dtype=bool)
+
+    with np.errstate(all="ignore"):
+        for k in range(length):
+            column = program.ops[:, k]
+
+            rows = np.flatnonzero(column == PUSH)
+            if rows.size:
+                stack[rows, sp[rows]] = program.consts[rows, k]
+                sp[rows] += 1
+
+            for op in range(ADD, NOP):
+                rows = np.flatnonzero(column == op)
+                if not rows.size:
+                    continue
+                a = stack[rows, sp[rows] - 2]
+                b = stack[rows, sp[rows] - 1]
+                result, bad = _apply(op, a, b)
+                errors[rows] |= bad | ~np.isfinite(result)
+                stack[rows, sp[rows] - 2] = result
+                sp[rows] -= 1
+
+    values = stack[:, 0].copy()
+    errors |= ~np.isfinite(values)  # 只有一个数的程序不经过上面的检查
+    values[errors] = np.nan
+    return values, errors
+
+
+def evaluate_many(nodes: Sequence[expr.Node], chunk: int = 4096) -> tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算 nodes 的值
+    按程序长度排序后分块编译，减少短程序的填充开销
+    返回: (结果向量, 错误掩码)，顺序与 nodes 一致
+    """
+    values = np.full(len(nodes), np.nan)
+    errors = np.ones(len(nodes), dtype=bool)
+    order = sorted(range(len(nodes)), key=lambda i: nodes[i].metrics().nodes)
+    for start in range(0, len(order), chunk):
+        idx = order[start:start + chunk]
+        v, e = evaluate(compile_program([nodes[i] for i in idx]))
+        values[idx] = v
+        errors[idx] = e
+    return values, errors
+
+
+def check_answers(nodes: Sequence[expr.Node], answers: Sequence[float],
+                  rel_tol: float = 1e-9, abs_tol: float = 1e-9) -> np.ndarray:
+    """逐题核对答案，返回布尔向量；计算出错的题目视为错误"""
+    values, errors = evaluate_many(nodes)
+    expected = np.asarray(answers, dtype=np.float64)
+    close = np.abs(values - expected) <= np.maximum(rel_tol * np.maximum(np.abs(values), np.abs(expected)), abs_tol)
+    return close & ~errors
@@ -0,0 +1,224 @@
+"""
+性能基准：用固定种子分别测量生成、复杂化、渲染、求值、核对答案和完整出卷流程的吞吐量
+每项报告 题目/秒、节点/秒、峰值内存以及树规模的分布，结果可写入 JSON 文件便于比较两次运行
+
+用法:
+    python bench.py [结果.json]            运行全部基准
+    python bench.py --compare 旧.json 新.json   比较两次运行的吞吐量
+"""
+from random import Random
+from typing import Callable
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import chaos
+import expr
+import main
+from verify import Verifier
+
+SEED = 20240601
+DEPTHS = (2, 4, 6, 8)   # 测量 make_chaos 的各个 max_depth
+
+
+def _nodes(node: expr.Node) -> list[expr.Node]:
+    """树中的全部节点（共享的子树只算一次），不递归"""
+    seen: dict[int, expr.Node] = {}
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if id(n) in seen:
+            continue
+        seen[id(n)] = n
+        if isinstance(n, expr.BinOp):
+            stack.append(n.right)
+            stack.append(n.left)
+    return list(seen.values())
+
+
+def _clear(trees: list[expr.Node]) -> None:
+    """清空各树所有节点的缓存，使渲染和求值从头算起"""
+    for tree in trees:
+        for n in _nodes(tree):
+            n.invalidate()
+
+
+def _distribution(values: list[int]) -> dict[str, float]:
+    values = sorted(values)
+    return {
+        "min": values[0],
+        "p50": values[len(values) // 2],
+        "p90": values[len(values) * 9 // 10],
+        "max": values[-1],
+        "mean": round(statistics.fmean(values), 2),
+    }
+
+
+def _measure(run: Callable[[], object], prepare: Callable[[], None] | None = None) -> tuple[float, int]:
+    """运行 run 两遍：第一遍计时，第二遍用 tracemalloc 记录峰值内存；返回 (秒, 峰值字节数)"""
+    if prepare is not None:
+        prepare()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    if prepare is not None:
+        prepare()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def _result(items: int, nodes: int | None, elapsed: float, peak: int, trees: list[expr.Node] | None = None) -> dict:
+    result = {
+        "items": items,
+        "seconds": round(elapsed, 6),
+        "items_per_sec": round(items / elapsed, 1),
+        "nodes_per_sec": round(nodes / elapsed, 1) if nodes is not None else None,
+        "peak_bytes": peak,
+    }
+    if trees:
+        metrics = [t.metrics() for t in trees]
+        result["nodes"] = _distribution([m.nodes for m in metrics])
+        result["depth"] = _distribution([m.depth for m in metrics])
+        result["latex_len"] = _distribution([m.latex_len for m in metrics])
+    return result
+
+
+def bench_gen_ans(count: int) -> dict:
+    """main.gen_ans 生成初始题目"""
+    def run() -> list:
+        rng = Random(SEED)
+        return [main.gen_ans(rng)[0] for _ in range(count)]
+    elapsed, peak = _measure(run)
+    trees = run()
+    return _result(count, sum(t.metrics().nodes for t in trees), elapsed, peak, trees)
+
+
+def bench_make_chaos(count: int, max_depth: int) -> dict:
+    """对 gen_ans 的结果做一次 make_chaos，节点/秒按产出的树计算"""
+    rng = Random(SEED)
+    seeds = [main.gen_ans(rng)[0] for _ in range(count)]
+
+    def run() -> list:
+        rng = Random(SEED)
+        return [chaos.make_chaos(node, max_depth=max_depth, rng=rng) for node in seeds]
+    elapsed, peak = _measure(run)
+    trees = run()
+    return _result(count, sum(t.metrics().nodes for t in trees), elapsed, peak, trees)
+
+
+def _problems(count: int) -> list[expr.Node]:
+    return [node for node, _ in main.gen_problems(count, rng=Random(SEED))]
+
+
+def bench_render(trees: list[expr.Node]) -> dict:
+    """清空缓存后对每棵树调用 str()"""
+    elapsed, peak = _measure(lambda: [str(t) for t in trees], lambda: _clear(trees))
+    return _result(len(trees), sum(len(_nodes(t)) for t in trees), elapsed, peak, trees)
+
+
+def bench_calc(trees: list[expr.Node]) -> dict:
+    """清空缓存后对每棵树调用 calc()，定义域错误的树计入耗时但不中断"""
+    def run() -> None:
+        for t in trees:
+            try:
+                t.calc()
+            except (ValueError, ZeroDivisionError, OverflowError):
+                pass
+    elapsed, peak = _measure(run, lambda: _clear(trees))
+    return _result(len(trees), sum(len(_nodes(t)) for t in trees), elapsed, peak, trees)
+
+
+def bench_check_answers(problems: list[tuple[expr.Node, int]], vectorized: bool) -> dict:
+    """清空缓存后核对答案：逐题 Verifier.filter_answers，或 batch.check_answers 一次向量化计算"""
+    trees = [node for node, _ in problems]
+    if vectorized:
+        import batch
+        run = lambda: batch.check_answers(trees, [ans for _, ans in problems])
+    else:
+        run = lambda: Verifier().filter_answers(problems)
+    elapsed, peak = _measure(run, lambda: _clear(trees))
+    return _result(len(trees), sum(len(_nodes(t)) for t in trees), elapsed, peak, trees)
+
+
+def bench_main() -> dict:
+    """完整的出卷流程：固定种子、不读写发放记录，输出丢弃"""
+    def run() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.main(seed=SEED, history=None)
+    elapsed, peak = _measure(run)
+    return _result(main.COUNT, None, elapsed, peak)
+
+
+def run_all(count: int = 1000) -> dict:
+    """运行全部基准，返回可序列化为 JSON 的结果"""
+    results = {"gen_ans": bench_gen_ans(count * 10)}
+    for depth in DEPTHS:
+        results[f"make_chaos[max_depth={depth}]"] = bench_make_chaos(count, depth)
+    trees = _problems(count)
+    results["render"] = bench_render(trees)
+    results["calc"] = bench_calc(trees)
+    problems = main.gen_problems(count, Verifier(), Random(SEED))
+    results["check_answers"] = bench_check_answers(problems, vectorized=False)
+    if importlib.util.find_spec("numpy") is not None:
+        results["check_answers[numpy]"] = bench_check_answers(problems, vectorized=True)
+    results["main"] = bench_main()
+    return {
+        "seed": SEED,
+        "count": count,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def report(data: dict) -> str:
+    lines = [f"{'benchmark':<24}{'items/s':>12}{'nodes/s':>12}{'peak KiB':>10}{'nodes p50/p90/max':>20}"]
+    for name, r in data["results"].items():
+        sizes = f"{r['nodes']['p50']}/{r['nodes']['p90']}/{r['nodes']['max']}" if "nodes" in r else "-"
+        nodes = f"{r['nodes_per_sec']:.1f}" if r["nodes_per_sec"] is not None else "-"
+        lines.append(f"{name:<24}{r['items_per_sec']:>12.1f}{nodes:>12}"
+                     f"{r['peak_bytes'] / 1024:>10.0f}{sizes:>20}")
+    return "\n".join(lines)
+
+
+def compare(old: dict, new: dict) -> str:
+    """两次运行中同名基准的吞吐量之比，大于 1 表示变快"""
+    lines = [f"{'benchmark':<24}{'old items/s':>14}{'new items/s':>14}{'speedup':>10}"]
+    for name, r in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name]["items_per_sec"], r["items_per_sec"]
+        lines.append(f"{name:<24}{before:>14.1f}{after:>14.1f}{after / before:>9.2f}x")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LogarithmPractice 性能基准")
+    parser.add_argument("output", nargs="?", help="把结果写入该 JSON 文件")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="每项基准的题目数")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="比较两个结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            print(compare(json.load(f), json.load(g)))
+        sys.exit()
+
+    data = run_all(args.count)
+    print(report(data))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
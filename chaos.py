@@ -1,99 +1,357 @@
 # chaos.py
-from random import choice, randint, random
-from typing import List, Union
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from dedup import DedupIndex, canonical_key
 import expr
+import fragments
+from verify import Verifier, safe_value
 
+default_rng = Random()  # 未指定 rng 时使用的随机数生成器
 
-def make_chaos(node: expr.Node, depth: int = 0, max_depth: int = 4) -> expr.Node:
+
+class Context(NamedTuple):
+    """
+    一次 make_chaos / make_targeted 调用的上下文，作为最后一个参数传给每个策略
+    策略中嵌套调用 make_chaos 时应沿用其中的各项，嵌套的改写才会被同样地检查、统计和收录
+    """
+    rng: Random
+    verifier: Optional[Verifier]
+    registry: "StrategyRegistry"
+    interner: Optional[expr.Interner] = None
+
+
+Strategy = Callable[[expr.Node, int, int, Context], expr.Node]  # (节点, 深度, 最大深度, 上下文) -> 改写结果
+
+
+class Profiler:
+    """
+    按 (策略, 深度) 统计 make_chaos 中每次策略调用，通过 profile() 启用
+    calls: 调用次数；applied / unchanged: 改写了节点 / 原样返回的次数
+    nodes_added: 改写前后节点数之差的累计；seconds: 累计耗时，包含策略内部嵌套的 make_chaos
+    """
+    FIELDS = ("calls", "applied", "unchanged", "nodes_added", "seconds")
+
+    def __init__(self):
+        self.rows: defaultdict[tuple[str, int], list] = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+
+    def record(self, name: str, depth: int, node: expr.Node, result: expr.Node, seconds: float) -> None:
+        row = self.rows[name, depth]
+        row[0] += 1
+        if result is node:
+            row[2] += 1
+        else:
+            row[1] += 1
+            row[3] += result.metrics().nodes - node.metrics().nodes
+        row[4] += seconds
+
+    def by_strategy(self) -> dict[str, dict[str, float]]:
+        """各深度合计后的统计，{策略名: {字段: 值}}"""
+        totals: dict[str, list] = {}
+        for (name, _), row in self.rows.items():
+            total = totals.setdefault(name, [0, 0, 0, 0, 0.0])
+            for i, v in enumerate(row):
+                total[i] += v
+        return {name: dict(zip(self.FIELDS, row)) for name, row in sorted(totals.items())}
+
+    def to_dict(self) -> dict:
+        return {
+            "by_strategy": self.by_strategy(),
+            "by_depth": [{"strategy": name, "depth": depth, **dict(zip(self.FIELDS, row))}
+                         for (name, depth), row in sorted(self.rows.items())],
+        }
+
+    def dump(self, path: str) -> None:
+        """写入文件：扩展名为 .csv 时每行一个 (策略, 深度)，否则为 to_dict() 的 JSON"""
+        import csv
+        import json
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.writer(f)
+                writer.writerow(("strategy", "depth", *self.FIELDS))
+                for (name, depth), row in sorted(self.rows.items()):
+                    writer.writerow((name, depth, *row))
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+
+    def report(self) -> str:
+        """各策略的统计，按累计耗时降序，每行一个策略"""
+        lines = []
+        stats = self.by_strategy()
+        for name, s in sorted(stats.items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"{name}: calls={s['calls']}, applied={s['applied']}, unchanged={s['unchanged']}, "
+                         f"nodes_added={s['nodes_added']}, seconds={s['seconds']:.4f}")
+        return "\n".join(lines)
+
+
+class StrategyRegistry:
+    """
+    按节点类型索引的复杂化策略表，只从适用于当前节点的策略中按权重抽取
+    每个策略有两组权重：前半段（depth < max_depth // 2）和后半段
+    stats[策略名] 记录 effective（改写了节点）和 noop（原样返回）的次数
+    profiler 为 None 时不做任何计时，见 profile()
+    """
+
+    def __init__(self):
+        self._types: dict[str, tuple[type, ...]] = {}
+        self._strategies: dict[str, Strategy] = {}
+        self._weights: dict[str, tuple[float, float]] = {}
+        self._index: dict[tuple[type, bool], tuple[list[Strategy], list[float]]] = {}
+        self.stats: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self.profiler: Optional[Profiler] = None
+
+    def register(self, strategy: Strategy, types: Tuple[type, ...],
+                 weight: float = 1.0, late_weight: Optional[float] = None) -> Strategy:
+        """注册适用于 types 类节点的策略；late_weight 默认与 weight 相同"""
+        name = strategy.__name__
+        self._types[name] = types
+        self._strategies[name] = strategy
+        self._weights[name] = (weight, weight if late_weight is None else late_weight)
+        self._index.clear()
+        return strategy
+
+    def set_weight(self, name: str, weight: float, late_weight: Optional[float] = None) -> None:
+        """调整已注册策略的权重，权重为 0 即禁用"""
+        if name not in self._strategies:
+            raise KeyError(f"Unknown strategy: {name}")
+        self._weights[name] = (weight, weight if late_weight is None else late_weight)
+        self._index.clear()
+
+    def configure(self, weights: Dict[str, Union[float, Tuple[float, float]]]) -> None:
+        """批量设置权重，值为单个数或 (前半段权重, 后半段权重)"""
+        for name, weight in weights.items():
+            if isinstance(weight, tuple):
+                self.set_weight(name, *weight)
+            else:
+                self.set_weight(name, weight)
+
+    def copy(self) -> "StrategyRegistry":
+        """复制策略与权重，统计数据不复制"""
+        registry = StrategyRegistry()
+        for name, strategy in self._strategies.items():
+            registry.register(strategy, self._types[name], *self._weights[name])
+        return registry
+
+    def _candidates(self, node_type: type, late: bool) -> tuple[list[Strategy], list[float]]:
+        """适用于 node_type 的策略及其累积权重，按需建立索引"""
+        key = (node_type, late)
+        if key not in self._index:
+            strategies, cum_weights, total = [], [], 0.0
+            for name, strategy in self._strategies.items():
+                weight = self._weights[name][late]
+                if weight > 0 and issubclass(node_type, self._types[name]):
+                    total += weight
+                    strategies.append(strategy)
+                    cum_weights.append(total)
+            self._index[key] = (strategies, cum_weights)
+        return self._index[key]
+
+    def pick(self, node: expr.Node, depth: int, max_depth: int, rng: Random) -> Optional[Strategy]:
+        """为 node 随机选择一个适用的策略，没有适用的策略时返回 None"""
+        strategies, cum_weights = self._candidates(node.base_type, depth >= max_depth // 2)
+        if not strategies:
+            return None
+        return rng.choices(strategies, cum_weights=cum_weights)[0]
+
+    def record(self, strategy: Strategy, effective: bool) -> None:
+        self.stats[strategy.__name__]["effective" if effective else "noop"] += 1
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+    def report(self) -> str:
+        """各策略的生效与空操作次数，每行一个策略"""
+        lines = []
+        for name, counter in sorted(self.stats.items()):
+            total = counter["effective"] + counter["noop"]
+            lines.append(f"{name}: effective={counter['effective']}, noop={counter['noop']}, "
+                         f"rate={counter['effective'] / total:.0%}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(registry: Optional[StrategyRegistry] = None) -> Iterator[Profiler]:
+    """
+    在 with 块内统计 registry（默认为 DEFAULT_REGISTRY）中各策略的调用，块结束后恢复原状
+    用法:
+        with profile() as profiler:
+            make_chaos(...)
+        profiler.dump("profile.csv")
+    只统计本进程，parallel 的子进程中的调用不计入
+    """
+    if registry is None:
+        registry = DEFAULT_REGISTRY
+    profiler = Profiler()
+    previous, registry.profiler = registry.profiler, profiler
+    try:
+        yield profiler
+    finally:
+        registry.profiler = previous
+
+
+def make_chaos(node: expr.Node, depth: int = 0, max_depth: int = 4,
+               verifier: Optional[Verifier] = None, rng: Optional[Random] = None,
+               registry: Optional[StrategyRegistry] = None,
+               interner: Optional[expr.Interner] = None) -> expr.Node:
     """
     将表达式复杂化 - 专注于对数变换
-    depth: 当前递归深度
-    max_depth: 最大递归深度，控制复杂度
+    不修改传入的树：子节点被改写时复制父节点（写时复制），未改写的子树与原树共享
+    用显式栈自底向上处理各节点，不递归，较大的 max_depth 也不会超出递归深度限制
+    depth: 当前深度
+    max_depth: 最大深度，控制复杂度
+    verifier: 若给出，检查每次改写前后的值，改变了值或无法计算的改写会被拒绝并重新选择策略
+    rng: 随机数生成器，传入固定种子的 Random 即可复现结果
+    registry: 策略表，默认为 DEFAULT_REGISTRY
+    interner: 若给出，结果中的节点都由它收录，结构相同的子树共享同一实例
     """
     if depth >= max_depth:
         return node
+    if rng is None:
+        rng = default_rng
+    if registry is None:
+        registry = DEFAULT_REGISTRY
+
+    # 后序遍历：先处理完左子树，再处理右子树，最后改写节点本身，随机数的使用顺序与逐层递归相同
+    # results 依次存放已处理完的子树，父节点从栈顶取回两个子节点
+    ctx = Context(rng, verifier, registry, interner)
+    stack: list[tuple[expr.Node, int, bool]] = [(node, depth, False)]
+    results: list[expr.Node] = []
+    while stack:
+        n, d, expanded = stack.pop()
+        if d >= max_depth:
+            results.append(n)
+            continue
+        if isinstance(n, expr.BinOp):
+            if not expanded:
+                stack.append((n, d, True))
+                stack.append((n.right, d + 1, False))
+                stack.append((n.left, d + 1, False))
+                continue
+            right = results.pop()
+            left = results.pop()
+            if left is not n.left or right is not n.right:
+                if interner is not None:
+                    n = interner.op(n.base_type, left, right)
+                else:
+                    n = n.with_children(left, right)
+        results.append(_rewrite(n, d, max_depth, ctx))
+    return results.pop()
+
+
+def _rewrite(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
+    """对子节点已处理完的 node 随机应用一个策略"""
+    verifier, registry, interner = ctx.verifier, ctx.registry, ctx.interner
+    if interner is not None:
+        node = interner.intern(node)
+
+    before = safe_value(node) if verifier is not None else None
+    for _ in range(verifier.retries + 1 if verifier is not None else 1):
+        strategy = registry.pick(node, depth, max_depth, ctx.rng)
+        if strategy is None:
+            return node
+        result = _call(ctx, strategy, node, depth, max_depth)
+        if result is node or verifier is None or verifier.accept(strategy.__name__, before, result):
+            return result if interner is None else interner.intern(result)
+    return node
 
-    # 先对子节点递归应用复杂化
-    if hasattr(node, 'left') and node.left is not None:
-        node.left = make_chaos(node.left, depth + 1, max_depth)
-    if hasattr(node, 'right') and node.right is not None:
-        node.right = make_chaos(node.right, depth + 1, max_depth)
-
-    # 随机选择复杂化策略 - 专注于对数变换
-    strategies = [
-        _apply_log_addition_rule,
-        _apply_log_subtraction_rule,
-        _apply_power_rule,
-        _apply_change_of_base,
-        _split_numeric_coefficient,
-        _introduce_identity_operations,
-        _apply_log_multiplication_rule,
-        _apply_exponent_log_relation,
-        _introduce_fraction_forms,
-        _apply_double_change_of_base,
-        _introduce_nested_logarithms,
-        _apply_reciprocal_rule,
-        _replace_constant_with_logarithm,  # 新增：将常数替换为对数
-        _introduce_polynomial_log_forms,   # 新增：引入多项式对数形式
-        _combine_multiple_rules
-    ]
 
-    # 根据深度调整策略权重
-    if depth < max_depth // 2:
-        strategy = choice(strategies)
+def _call(ctx: Context, strategy: Strategy, node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+    """调用策略并记入 ctx.registry 的统计，启用了 profile() 时计时"""
+    registry = ctx.registry
+    profiler = registry.profiler
+    if profiler is None:
+        result = strategy(node, depth, max_depth, ctx)
     else:
-        # 后半段更倾向于复杂变换
-        strategy = choice(strategies)
-
-    return strategy(node, depth, max_depth)
+        start = perf_counter()
+        result = strategy(node, depth, max_depth, ctx)
+        profiler.record(strategy.__name__, depth, node, result, perf_counter() - start)
+    registry.record(strategy, result is not node)
+    return result
+
+
+def _positions(root: expr.Node) -> list[tuple[expr.Node, Tuple[int, ...]]]:
+    """树中各位置的节点及从根到它的路径（0 为左子节点，1 为右子节点），先序，不递归"""
+    positions = []
+    stack: list[tuple[expr.Node, Tuple[int, ...]]] = [(root, ())]
+    while stack:
+        node, path = stack.pop()
+        positions.append((node, path))
+        if isinstance(node, expr.BinOp):
+            stack.append((node.right, path + (1,)))
+            stack.append((node.left, path + (0,)))
+    return positions
+
+
+def _replace_at(root: expr.Node, path: Tuple[int, ...], new: expr.Node) -> expr.Node:
+    """把 path 处的子树换成 new，只复制路径上的祖先节点，原树不变"""
+    ancestors = []
+    node = root
+    for step in path:
+        ancestors.append(node)
+        node = node.right if step else node.left
+    for parent, step in zip(reversed(ancestors), reversed(path)):
+        new = parent.with_children(parent.left, new) if step else parent.with_children(new, parent.right)
+    return new
+
+
+def make_targeted(node: expr.Node, band: Tuple[int, int], metric: str = "latex_len", max_depth: int = 4,
+                  verifier: Optional[Verifier] = None, rng: Optional[Random] = None,
+                  registry: Optional[StrategyRegistry] = None, attempts: int = 100) -> expr.Node:
+    """
+    定向复杂化：反复改写树中的一个位置，直到指标 metric（expr.Metrics 的字段名）落入 band = [lo, hi)
+    只在指标不超过剩余预算 hi - 当前值 的子树中选位置，并只接受使指标增长且不越过 hi 的改写，
+    剩余预算越小，能选的子树越小，大幅增长的策略也会被拒绝，最后只剩小步增长的改写，
+    因此几乎每棵树都能落入区间，不必像 make_chaos 那样整棵生成后再按难度筛选
+    与 make_chaos 一样不修改传入的树
+    max_depth: 位置的深度达到 max_depth // 2 后使用策略的后半段权重，同 make_chaos
+    verifier: 若给出，改变了值的改写会被拒绝
+    attempts: 连续这么多次改写都不可接受时放弃，返回的树可能仍低于 lo；调用者应检查结果
+    """
+    if rng is None:
+        rng = default_rng
+    if registry is None:
+        registry = DEFAULT_REGISTRY
+    lo, hi = band
+    ctx = Context(rng, verifier, registry)
+
+    value = getattr(node.metrics(), metric)
+    failures = 0
+    while value < lo and failures < attempts:
+        budget = hi - value
+        positions = [p for p in _positions(node) if getattr(p[0].metrics(), metric) < budget]
+        if not positions:
+            break
+        target, path = rng.choice(positions)
+        depth = len(path)
+        strategy = registry.pick(target, depth, max_depth, rng)
+        result = target if strategy is None else _call(ctx, strategy, target, depth, max_depth)
+        if result is not target:
+            candidate = _replace_at(node, path, result)
+            new_value = getattr(candidate.metrics(), metric)
+            if value < new_value < hi and (verifier is None or
+                                           verifier.accept(strategy.__name__, safe_value(target), result)):
+                node, value = candidate, new_value
+                failures = 0
+                continue
+        failures += 1
+    return node
 
 
-def _replace_constant_with_logarithm(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _replace_constant_with_logarithm(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """将常数替换为对数表达式"""
     if isinstance(node, expr.Value) and isinstance(node.value, (int, float)):
         value = node.value
 
-        # 常见对数值替换
-        if value == 1:
-            replacements = [
-                expr.Log(expr.Value(2), expr.Value(2)),
-                expr.Log(expr.Value(3), expr.Value(3)),
-                expr.Log(expr.Value(5), expr.Value(5)),
-                expr.Log(expr.Value(10), expr.Value(10)),
-                expr.Add(
-                    expr.Log(expr.Value(2), expr.Value(5)),
-                    expr.Log(expr.Value(5), expr.Value(2))
-                ),  # lg5 + lg2 = lg10 = 1
-            ]
-            return choice(replacements)
-
-        elif value == 2:
-            replacements = [
-                expr.Log(expr.Value(2), expr.Value(4)),
-                expr.Log(expr.Value(3), expr.Value(9)),
-                expr.Log(expr.Value(5), expr.Value(25)),
-                expr.Mul(expr.Value(2), expr.Log(
-                    expr.Value(2), expr.Value(2))),
-                expr.Add(
-                    expr.Log(expr.Value(2), expr.Value(2)),
-                    expr.Log(expr.Value(2), expr.Value(2))
-                ),
-            ]
-            return choice(replacements)
-
-        elif value == 0:
-            replacements = [
-                expr.Log(expr.Value(2), expr.Value(1)),
-                expr.Sub(
-                    expr.Log(expr.Value(2), expr.Value(4)),
-                    expr.Log(expr.Value(2), expr.Value(4))
-                ),
-            ]
-            return choice(replacements)
-
-        elif value > 0 and random() < 0.3:
+        # 常见对数值替换，候选见 fragments 中的 LOG 片段
+        lib = fragments.library()
+        if lib.has(value, fragments.LOG):
+            return lib.choice(value, fragments.LOG, ctx.rng)
+
+        elif value > 0 and ctx.rng.random() < 0.3:
             # 尝试将其他正数表示为对数形式
-            base = choice([2, 3, 5, 10])
+            base = ctx.rng.choice([2, 3, 5, 10])
             if value == base:
                 return expr.Log(expr.Value(base), expr.Value(base))
             elif value == base**2:
@@ -104,77 +362,21 @@ def _replace_constant_with_logarithm(node: expr.Node, depth: int, max_depth: int
     return node
 
 
-def _introduce_polynomial_log_forms(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _introduce_polynomial_log_forms(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """引入多项式对数形式，如 (lg2)^2 + lg2*lg5 + lg5"""
     if isinstance(node, expr.Value) and isinstance(node.value, (int, float)) and node.value > 0:
-        if random() < 0.2:
-            # 创建多项式对数表达式
-            forms = [
-                # lg2lg5 + lg2lg2 + lg5 类型
-                lambda: expr.Add(
-                    expr.Add(
-                        expr.Mul(
-                            expr.Log(expr.Value(10), expr.Value(2)),
-                            expr.Log(expr.Value(10), expr.Value(5))
-                        ),
-                        expr.Pow(
-                            expr.Log(expr.Value(10), expr.Value(2)),
-                            expr.Value(2)
-                        )
-                    ),
-                    expr.Log(expr.Value(10), expr.Value(5)),
-                ),
-                # lg2lg5 + lg5lg5 + lg2
-                lambda: expr.Add(
-                    expr.Add(
-                        expr.Mul(
-                            expr.Log(expr.Value(10), expr.Value(2)),
-                            expr.Log(expr.Value(10), expr.Value(5))
-                        ),
-                        expr.Pow(
-                            expr.Log(expr.Value(10), expr.Value(5)),
-                            expr.Value(2)
-                        )
-                    ),
-                    expr.Log(expr.Value(10), expr.Value(2)),
-                ),
-                # (lg2)^2 + (lg5)^2 + 2(lg2)(lg5) 类型
-                lambda: expr.Add(
-                    expr.Add(
-                        expr.Mul(
-                            expr.Log(expr.Value(10), expr.Value(2)),
-                            expr.Log(expr.Value(10), expr.Value(2))
-                        ),
-                        expr.Mul(
-                            expr.Log(expr.Value(10), expr.Value(5)),
-                            expr.Log(expr.Value(10), expr.Value(5))
-                        )
-                    ),
-                    expr.Mul(
-                        expr.Mul(
-                            expr.Value(2),
-                            expr.Log(expr.Value(10), expr.Value(5))
-                        ),
-                        expr.Log(expr.Value(10), expr.Value(2))
-                    )
-                )
-            ]
-            return expr.Mul(node, choice(forms)())
-
-    elif isinstance(node, expr.Add) and random() < 0.1:
-        # 在加法表达式中引入对数多项式
-        return expr.Mul(
-            expr.Add(
-                expr.Log(expr.Value(10), expr.Value(2)),
-                expr.Log(expr.Value(10), expr.Value(5))
-            ),
-            node
-        )
+        if ctx.rng.random() < 0.2:
+            # 乘以一个值为 1 的对数多项式，候选见 fragments 中的 POLYNOMIAL 片段
+            return expr.Mul(node, fragments.library().choice(1, fragments.POLYNOMIAL, ctx.rng))
+
+    elif isinstance(node, expr.Add) and ctx.rng.random() < 0.1:
+        # 在加法表达式外乘以一个值为 1 的因子，如 (lg2 + lg5)，候选见 fragments 中的 POLYNOMIAL_FACTOR 片段
+        return expr.Mul(fragments.library().choice(1, fragments.POLYNOMIAL_FACTOR, ctx.rng), node)
 
     return node
 
 
-def _apply_log_addition_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_log_addition_rule(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用对数加法法则：log_a(b) = log_a(b*c) - log_a(c)"""
     if isinstance(node, expr.Log):
         base = node.left
@@ -183,24 +385,24 @@ def _apply_log_addition_rule(node: expr.Node, depth: int, max_depth: int) -> exp
         # 更多样的乘数选择
         multiplier_choices = [
             # 底数的幂次
-            lambda: expr.Pow(base, expr.Value(randint(1, 4))),
+            lambda: expr.Pow(base, expr.Value(ctx.rng.randint(1, 4))),
             # 简单数字
-            lambda: expr.Value(choice([2, 3, 4, 5, 6, 8, 9])),
+            lambda: expr.Value(ctx.rng.choice([2, 3, 4, 5, 6, 8, 9])),
             # 分数形式
-            lambda: expr.Div(expr.Value(1), expr.Value(choice([2, 3, 4]))),
+            lambda: expr.Div(expr.Value(1), expr.Value(ctx.rng.choice([2, 3, 4]))),
             # 另一个对数表达式
             lambda: expr.Log(
-                expr.Value(choice([2, 3, 5])),
-                expr.Value(choice([4, 8, 9, 16]))
+                expr.Value(ctx.rng.choice([2, 3, 5])),
+                expr.Value(ctx.rng.choice([4, 8, 9, 16]))
             ),
             # 加法表达式
             lambda: expr.Add(
-                expr.Value(randint(1, 3)),
-                expr.Value(randint(1, 3))
+                expr.Value(ctx.rng.randint(1, 3)),
+                expr.Value(ctx.rng.randint(1, 3))
             )
         ]
 
-        multiplier = choice(multiplier_choices)()
+        multiplier = ctx.rng.choice(multiplier_choices)()
         new_arg = expr.Mul(arg, multiplier)
         log1 = expr.Log(base, new_arg)
         log2 = expr.Log(base, multiplier)
@@ -209,26 +411,26 @@ def _apply_log_addition_rule(node: expr.Node, depth: int, max_depth: int) -> exp
     return node
 
 
-def _apply_log_subtraction_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_log_subtraction_rule(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用对数减法法则：log_a(b) = log_a(b/c) + log_a(c)"""
     if isinstance(node, expr.Log):
         base = node.left
         arg = node.right
 
         divisor_choices = [
-            lambda: expr.Pow(base, expr.Value(randint(1, 3))),
-            lambda: expr.Value(choice([2, 3, 4, 5, 6])),
+            lambda: expr.Pow(base, expr.Value(ctx.rng.randint(1, 3))),
+            lambda: expr.Value(ctx.rng.choice([2, 3, 4, 5, 6])),
             lambda: expr.Mul(
-                expr.Value(choice([2, 3])),
-                expr.Value(choice([2, 3]))
+                expr.Value(ctx.rng.choice([2, 3])),
+                expr.Value(ctx.rng.choice([2, 3]))
             ),
             lambda: expr.Log(
-                expr.Value(choice([2, 3])),
-                expr.Value(choice([4, 8, 9]))
+                expr.Value(ctx.rng.choice([2, 3])),
+                expr.Value(ctx.rng.choice([4, 8, 9]))
             )
         ]
 
-        divisor = choice(divisor_choices)()
+        divisor = ctx.rng.choice(divisor_choices)()
         new_arg = expr.Div(arg, divisor)
         log1 = expr.Log(base, new_arg)
         log2 = expr.Log(base, divisor)
@@ -237,7 +439,7 @@ def _apply_log_subtraction_rule(node: expr.Node, depth: int, max_depth: int) ->
     return node
 
 
-def _apply_log_multiplication_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_log_multiplication_rule(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用对数乘法法则：k * log_a(b) = log_a(b^k)"""
     if isinstance(node, expr.Mul) and isinstance(node.left, expr.Value) and isinstance(node.right, expr.Log):
         k = node.left.value
@@ -250,15 +452,15 @@ def _apply_log_multiplication_rule(node: expr.Node, depth: int, max_depth: int)
     return node
 
 
-def _apply_power_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_power_rule(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用幂法则增强版"""
     if isinstance(node, expr.Log):
-        k = randint(2, 5)
+        k = ctx.rng.randint(2, 5)
         base = node.left
         arg = node.right
 
         # 更多样的幂次处理
-        if random() < 0.4:
+        if ctx.rng.random() < 0.4:
             # 使用分数幂次
             new_arg = expr.Pow(arg, expr.Div(expr.Value(1), expr.Value(k)))
             inner_log = expr.Log(base, new_arg)
@@ -271,7 +473,7 @@ def _apply_power_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
     return node
 
 
-def _apply_change_of_base(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_change_of_base(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用换底公式增强版"""
     if isinstance(node, expr.Log):
         old_base = node.left
@@ -288,7 +490,7 @@ def _apply_change_of_base(node: expr.Node, depth: int, max_depth: int) -> expr.N
             expr.Mul(expr.Value(2), expr.Value(2)),  # 2*2=4
         ]
 
-        new_base = choice(new_base_choices)
+        new_base = ctx.rng.choice(new_base_choices)
         numerator = expr.Log(new_base, arg)
         denominator = expr.Log(new_base, old_base)
 
@@ -296,35 +498,36 @@ def _apply_change_of_base(node: expr.Node, depth: int, max_depth: int) -> expr.N
     return node
 
 
-def _apply_double_change_of_base(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_double_change_of_base(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """双重换底：先换到一个中间底数，再换到另一个底数"""
     if isinstance(node, expr.Log):
         # 第一次换底
-        intermediate_base = expr.Value(choice([2, 3, 5, 10]))
+        intermediate_base = expr.Value(ctx.rng.choice([2, 3, 5, 10]))
         first_change = expr.Div(
             expr.Log(intermediate_base, node.right),
             expr.Log(intermediate_base, node.left)
         )
 
-        # 对结果再次应用复杂化
-        return make_chaos(first_change, depth + 1, max_depth)
+        # 对结果再次应用复杂化，沿用调用者的检查器、策略表和收录表；
+        # 每层至多嵌套一次且 depth 递增，调用深度不超过 max_depth
+        return make_chaos(first_change, depth + 1, max_depth, ctx.verifier, ctx.rng, ctx.registry, ctx.interner)
     return node
 
 
-def _apply_exponent_log_relation(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_exponent_log_relation(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """利用指数和对数的关系：a^{log_a(b)} = b"""
     if isinstance(node, expr.Value) and isinstance(node.value, (int, float)) and node.value > 0:
-        base = expr.Value(choice([2, 3, 5, 10, 'e']))
+        base = expr.Value(ctx.rng.choice([2, 3, 5, 10, 'e']))
         return expr.Pow(base, expr.Log(base, expr.Value(node.value)))
     return node
 
 
-def _introduce_nested_logarithms(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _introduce_nested_logarithms(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """引入嵌套对数"""
     if isinstance(node, expr.Log):
-        if random() < 0.2:
+        if ctx.rng.random() < 0.2:
             # 在对数内部再嵌套一个对数
-            base = expr.Value(choice([2, 3, 5]))
+            base = expr.Value(ctx.rng.choice([2, 3, 5]))
             nested_log = expr.Log(
                 base,
                 expr.Pow(base, node.right)
@@ -333,19 +536,19 @@ def _introduce_nested_logarithms(node: expr.Node, depth: int, max_depth: int) ->
     return node
 
 
-def _introduce_fraction_forms(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _introduce_fraction_forms(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """引入分数形式"""
     if isinstance(node, expr.Value) and isinstance(node.value, (int, float)):
-        if node.value > 1 and random() < 0.4:
+        if node.value > 1 and ctx.rng.random() < 0.4:
             # 将整数表示为分数形式
-            numerator = node.value * randint(2, 4)
-            denominator = randint(2, 4)
+            numerator = node.value * ctx.rng.randint(2, 4)
+            denominator = ctx.rng.randint(2, 4)
             return expr.Div(expr.Value(numerator), expr.Value(denominator))
 
     elif isinstance(node, (expr.Add, expr.Sub)):
         # 将加减法转换为同分母分数加减
-        if random() < 0.3:
-            denominator = expr.Value(randint(2, 5))
+        if ctx.rng.random() < 0.3:
+            denominator = expr.Value(ctx.rng.randint(2, 5))
             left_num = expr.Mul(node.left, denominator)
             right_num = expr.Mul(node.right, denominator)
 
@@ -359,7 +562,7 @@ def _introduce_fraction_forms(node: expr.Node, depth: int, max_depth: int) -> ex
     return node
 
 
-def _apply_reciprocal_rule(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _apply_reciprocal_rule(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """应用倒数规则：log_a(b) = 1 / log_b(a)"""
     if isinstance(node, expr.Log):
         return expr.Div(
@@ -369,27 +572,27 @@ def _apply_reciprocal_rule(node: expr.Node, depth: int, max_depth: int) -> expr.
     return node
 
 
-def _combine_multiple_rules(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _combine_multiple_rules(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """组合多种规则"""
-    if isinstance(node, expr.Log) and random() < 0.7:
+    if isinstance(node, expr.Log) and ctx.rng.random() < 0.7:
         # 先应用换底公式
-        temp = _apply_change_of_base(node, depth, max_depth)
+        temp = _apply_change_of_base(node, depth, max_depth, ctx)
         # 再对结果应用幂法则
-        return _apply_power_rule(temp, depth, max_depth)
+        return _apply_power_rule(temp, depth, max_depth, ctx)
     return node
 
 
-def _split_numeric_coefficient(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _split_numeric_coefficient(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """拆分数值系数增强版"""
     if isinstance(node, expr.Value) and isinstance(node.value, (int, float)) and abs(node.value) > 1:
-        if random() < 0.6:
+        if ctx.rng.random() < 0.6:
             # 加法拆分
             if node.value > 1:
-                m = randint(1, int(node.value) - 1)
+                m = ctx.rng.randint(1, int(node.value) - 1)
                 n = node.value - m
                 return expr.Add(expr.Value(m), expr.Value(n))
             else:
-                m = randint(int(node.value) + 1, 0)
+                m = ctx.rng.randint(int(node.value) + 1, 0)
                 n = node.value - m
                 return expr.Add(expr.Value(m), expr.Value(n))
         else:
@@ -398,49 +601,30 @@ def _split_numeric_coefficient(node: expr.Node, depth: int, max_depth: int) -> e
                 factors = [i for i in range(
                     2, abs(node.value)) if node.value % i == 0]
                 if factors:
-                    m = choice(factors)
+                    m = ctx.rng.choice(factors)
                     n = node.value // m
                     return expr.Mul(expr.Value(m), expr.Value(n))
             # 分数拆分
-            if random() < 0.4:
+            if ctx.rng.random() < 0.4:
                 return expr.Div(
-                    expr.Value(node.value * randint(2, 4)),
-                    expr.Value(randint(2, 4))
+                    expr.Value(node.value * ctx.rng.randint(2, 4)),
+                    expr.Value(ctx.rng.randint(2, 4))
                 )
     return node
 
 
-def _introduce_identity_operations(node: expr.Node, depth: int, max_depth: int) -> expr.Node:
+def _introduce_identity_operations(node: expr.Node, depth: int, max_depth: int, ctx: Context) -> expr.Node:
     """引入恒等运算增强版"""
-    # 更多样的恒等形式
-    one_forms: List[expr.Node] = [
-        expr.Value(1),
-        expr.Div(expr.Value(2), expr.Value(2)),
-        expr.Div(expr.Value(3), expr.Value(3)),
-        expr.Pow(expr.Value(1), expr.Value(randint(2, 5))),
-        expr.Log(expr.Value(2), expr.Value(2)),
-        expr.Log(expr.Value(3), expr.Value(3)),
-        expr.Add(expr.Value(1), expr.Value(0)),
-        expr.Sub(expr.Value(2), expr.Value(1)),
-    ]
-
-    zero_forms: List[expr.Node] = [
-        expr.Value(0),
-        expr.Sub(expr.Value(2), expr.Value(2)),
-        expr.Sub(expr.Value(3), expr.Value(3)),
-        expr.Mul(expr.Value(0), expr.Value(randint(2, 5))),
-        expr.Div(expr.Value(0), expr.Value(randint(1, 5))),
-    ]
-
-    if random() < 0.5:
+    # 各种 1 和 0 的写法见 fragments 中的 IDENTITY 片段
+    if ctx.rng.random() < 0.5:
+        lib = fragments.library()
         if isinstance(node, expr.Mul):
-            return expr.Mul(node, choice(one_forms))
+            return expr.Mul(node, lib.choice(1, fragments.IDENTITY, ctx.rng))
         elif isinstance(node, expr.Add):
-            return expr.Add(node, choice(zero_forms))
+            return expr.Add(node, lib.choice(0, fragments.IDENTITY, ctx.rng))
         elif isinstance(node, expr.Div):
             # 分子分母同乘一个非零表达式
-            multiplier = choice(
-                [f for f in one_forms if not isinstance(f, expr.Value) or f.value != 0])
+            multiplier = lib.choice(1, fragments.IDENTITY, ctx.rng)
             return expr.Div(
                 expr.Mul(node.left, multiplier),
                 expr.Mul(node.right, multiplier)
@@ -449,12 +633,42 @@ def _introduce_identity_operations(node: expr.Node, depth: int, max_depth: int)
     return node
 
 
+DEFAULT_REGISTRY = StrategyRegistry()
+# 随机选择复杂化策略 - 专注于对数变换；后半段更倾向于复杂变换
+DEFAULT_REGISTRY.register(_apply_log_addition_rule, (expr.Log,))
+DEFAULT_REGISTRY.register(_apply_log_subtraction_rule, (expr.Log,))
+DEFAULT_REGISTRY.register(_apply_power_rule, (expr.Log,))
+DEFAULT_REGISTRY.register(_apply_change_of_base, (expr.Log,))
+DEFAULT_REGISTRY.register(_split_numeric_coefficient, (expr.Value,))
+DEFAULT_REGISTRY.register(_introduce_identity_operations, (expr.Mul, expr.Add, expr.Div))
+DEFAULT_REGISTRY.register(_apply_log_multiplication_rule, (expr.Mul,))
+DEFAULT_REGISTRY.register(_apply_exponent_log_relation, (expr.Value,))
+DEFAULT_REGISTRY.register(_introduce_fraction_forms, (expr.Value, expr.Add, expr.Sub))
+DEFAULT_REGISTRY.register(_apply_double_change_of_base, (expr.Log,), 1.0, 2.0)
+DEFAULT_REGISTRY.register(_introduce_nested_logarithms, (expr.Log,), 1.0, 2.0)
+DEFAULT_REGISTRY.register(_apply_reciprocal_rule, (expr.Log,))
+DEFAULT_REGISTRY.register(_replace_constant_with_logarithm, (expr.Value,))  # 将常数替换为对数
+DEFAULT_REGISTRY.register(_introduce_polynomial_log_forms, (expr.Value, expr.Add), 1.0, 2.0)  # 引入多项式对数形式
+DEFAULT_REGISTRY.register(_combine_multiple_rules, (expr.Log,), 1.0, 2.0)
+
+
 # 新增：批量生成复杂对数表达式
-def generate_complex_logarithm_exercises(count: int = 10, max_depth: int = 4) -> List[tuple]:
+def generate_complex_logarithm_exercises(count: int = 10, max_depth: int = 4,
+                                        band: Optional[Tuple[int, int]] = None,
+                                        metric: str = "latex_len",
+                                        rng: Optional[Random] = None,
+                                        index: Optional[DedupIndex] = None) -> List[tuple]:
     """
     生成复杂对数表达式练习题
-    返回: [(复杂表达式, 简化表达式), ...]
+    rng: 随机数生成器，传入固定种子的 Random 即可复现结果
+    index: 判重索引，跳过其中已有的题目；默认只在本次结果内去重
+    band: 若给出，只保留指标 metric（expr.Metrics 的字段名）落在 [lo, hi) 内的题目
+    返回: [(复杂表达式, 简化表达式), ...]，按指标 metric 升序排列
     """
+    if rng is None:
+        rng = default_rng
+    if index is None:
+        index = DedupIndex()
     exercises = []
 
     # 基础对数表达式模板
@@ -486,15 +700,27 @@ def generate_complex_logarithm_exercises(count: int = 10, max_depth: int = 4) ->
         lambda: expr.Value(2),  # 会被替换为复杂形式
     ]
 
-    for _ in range(count):
+    tries = 0
+    while len(exercises) < count:
+        tries += 1
+        if tries > count * 100:
+            raise RuntimeError(f"Only {len(exercises)} of {count} exercises fit the band {band}")
+
         # 选择基础模板
-        base_expr = choice(base_templates)()
+        base_expr = rng.choice(base_templates)()
 
         # 应用复杂化
-        complex_expr = make_chaos(base_expr, max_depth=max_depth)
+        complex_expr = make_chaos(base_expr, max_depth=max_depth, rng=rng)
+
+        # 按结构指标筛选，不需要渲染
+        if band is not None and not band[0] <= getattr(complex_expr.metrics(), metric) < band[1]:
+            continue
+        if not index.add(canonical_key(complex_expr)):
+            continue
 
         exercises.append((complex_expr, base_expr))
 
+    exercises.sort(key=lambda x: getattr(x[0].metrics(), metric))
     return exercises
 
 
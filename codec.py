@@ -0,0 +1,216 @@
+"""
+表达式树的紧凑二进制格式
+
+每棵树按前序写出，每个节点以一个字节开头：
+    0 - 5        Add, Sub, Mul, Div, Pow, Log，后跟左、右子树
+    6, 7         e, π
+    8            小数，后跟 8 字节小端 double
+    9            整数，后跟 zigzag 编码的 varint
+    16 - 255     小整数 0 - 239，值为该字节减 16
+前序编码可以自行确定结束位置，因此多棵树可以直接拼接；共享的子树会被重复写出
+多棵树的流（Writer / Reader）在每棵树前加上 varint 表示的字节数，便于跳过或分块读取
+"""
+from typing import BinaryIO, Iterable, Iterator
+import struct
+import expr
+
+_ADD, _SUB, _MUL, _DIV, _POW, _LOG = range(6)
+_E = 6
+_PI = 7
+_FLOAT = 8
+_INT = 9
+_SMALL = 16     # 小整数直接放在操作码中
+_SMALL_MAX = 256 - _SMALL
+
+_OPS: dict[type, int] = {expr.Add: _ADD, expr.Sub: _SUB, expr.Mul: _MUL, expr.Div: _DIV, expr.Pow: _POW, expr.Log: _LOG}
+_CLASSES: list[type] = [expr.Add, expr.Sub, expr.Mul, expr.Div, expr.Pow, expr.Log]
+_DOUBLE = struct.Struct("<d")
+
+Buffer = bytes | bytearray | memoryview
+
+
+def write_varint(out: bytearray, n: int) -> None:
+    """写入非负整数，每字节 7 位，低位在前"""
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data: Buffer, pos: int) -> tuple[int, int]:
+    """读取 write_varint 写入的整数，返回 (整数, 新位置)"""
+    n = shift = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise ValueError("Truncated varint") from None
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _encode_value(out: bytearray, value: int | float | str) -> None:
+    if isinstance(value, str):
+        if value == "e":
+            out.append(_E)
+        elif value == "pi":
+            out.append(_PI)
+        else:
+            raise ValueError(f"Unknown value: {value}")
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif 0 <= value < _SMALL_MAX:
+        out.append(_SMALL + value)
+    else:
+        out.append(_INT)
+        write_varint(out, value << 1 if value >= 0 else (~value << 1) | 1)  # zigzag
+
+
+def encode(out: bytearray, node: expr.Node) -> None:
+    """把 node 追加到 out 末尾"""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, expr.BinOp):
+            out.append(_OPS[n.base_type])  # Arena 视图等子类按其基类编码
+            stack.append(n.right)
+            stack.append(n.left)
+        else:
+            _encode_value(out, n.value)
+
+
+def decode(data: Buffer, pos: int = 0) -> tuple[expr.Node, int]:
+    """
+    从 data[pos:] 解码一棵树，返回 (树, 结束位置)
+    data 可以是 memoryview，解码过程不复制数据
+    """
+    pending: list[list] = []  # 等待右子树的运算节点: [类型, 左子树]
+    while True:
+        try:
+            op = data[pos]
+        except IndexError:
+            raise ValueError("Truncated tree") from None
+        pos += 1
+        if op < _E:
+            pending.append([_CLASSES[op], None])
+            continue
+        elif op >= _SMALL:
+            node: expr.Node = expr.Value(op - _SMALL)
+        elif op == _INT:
+            z, pos = read_varint(data, pos)
+            node = expr.Value(-(z >> 1) - 1 if z & 1 else z >> 1)
+        elif op == _FLOAT:
+            if pos + _DOUBLE.size > len(data):
+                raise ValueError("Truncated tree")
+            node = expr.Value(_DOUBLE.unpack_from(data, pos)[0])
+            pos += _DOUBLE.size
+        elif op == _E:
+            node = expr.Value("e")
+        elif op == _PI:
+            node = expr.Value("pi")
+        else:
+            raise ValueError(f"Unknown op code {op} at byte {pos - 1}")
+
+        # 子树完成后逐层向上组装，直到遇到还缺左子树的节点
+        while pending:
+            top = pending[-1]
+            if top[1] is None:
+                top[1] = node
+                break
+            pending.pop()
+            node = top[0](top[1], node)
+        else:
+            return node, pos
+
+
+def dumps(node: expr.Node) -> bytes:
+    """把一棵树编码为字节串"""
+    out = bytearray()
+    encode(out, node)
+    return bytes(out)
+
+
+def loads(data: Buffer) -> expr.Node:
+    """dumps 的逆运算，data 中不能有多余的字节"""
+    node, pos = decode(data)
+    if pos != len(data):
+        raise ValueError(f"Trailing data after tree: {len(data) - pos} bytes")
+    return node
+
+
+def iter_loads(data: Buffer) -> Iterator[expr.Node]:
+    """逐棵解码 Writer 写出的整段数据，如内存映射的文件"""
+    data = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        size, pos = read_varint(data, pos)
+        yield loads(data[pos:pos + size])
+        pos += size
+
+
+class Writer:
+    """向二进制文件中逐棵写入树"""
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self._buf = bytearray()
+
+    def write(self, node: expr.Node) -> None:
+        tree = bytearray()
+        encode(tree, node)
+        write_varint(self._buf, len(tree))
+        self._buf += tree
+        if len(self._buf) >= 1 << 16:
+            self.flush()
+
+    def write_many(self, nodes: Iterable[expr.Node]) -> None:
+        for node in nodes:
+            self.write(node)
+
+    def flush(self) -> None:
+        self.f.write(self._buf)
+        self._buf.clear()
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+
+class Reader:
+    """从二进制文件中逐棵读出 Writer 写入的树"""
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+
+    def _read_size(self) -> int | None:
+        n = shift = 0
+        while True:
+            byte = self.f.read(1)
+            if not byte:
+                if shift:
+                    raise ValueError("Truncated varint")
+                return None
+            n |= (byte[0] & 0x7F) << shift
+            if byte[0] < 0x80:
+                return n
+            shift += 7
+
+    def read(self) -> expr.Node | None:
+        """读出下一棵树，到达文件末尾时返回 None"""
+        size = self._read_size()
+        if size is None:
+            return None
+        data = self.f.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated tree")
+        return loads(data)
+
+    def __iter__(self) -> Iterator[expr.Node]:
+        while (node := self.read()) is not None:
+            yield node
@@ -0,0 +1,191 @@
+"""判重：表达式的规范形式及已出现题目的索引"""
+from fractions import Fraction
+from hashlib import blake2b
+from typing import TYPE_CHECKING, Iterable, Iterator, TypeVar
+import expr
+
+if TYPE_CHECKING:
+    import sqlite3
+
+P = TypeVar("P", bound=tuple)
+
+MAX_POW_BITS = 256  # 折叠常数乘方时结果位数的上限
+
+# 规范形式的中间结果：
+#   int | Fraction                数值常数
+#   ("+", 常数项, (各项, ...))     展平后的加法，各项已排序
+#   ("*", 常数因子, (各因子, ...)) 展平后的乘法，同上
+#   str                           其余表达式的规范文本
+_Form = int | Fraction | tuple | str
+_NUMBER = (int, Fraction)
+
+_TAGS: dict[type, str] = {expr.Value: "", expr.Add: "+", expr.Mul: "*", expr.Sub: "-",  # 节点的 base_type -> 运算标记
+                          expr.Div: "/", expr.Pow: "^", expr.Log: "log"}
+
+
+def _text(form: _Form) -> str:
+    """中间结果的规范文本"""
+    if type(form) is str:
+        return form
+    if type(form) is not tuple:
+        return str(form)
+    op, const, parts = form
+    if const != (0 if op == "+" else 1):
+        parts = tuple(sorted((*parts, str(const))))
+    return f"{op}({','.join(parts)})"
+
+
+def _flat(op: str, a: _Form, b: _Form) -> _Form:
+    """展平加法或乘法，合并常数，并丢掉 +0 和 *1"""
+    unit = 0 if op == "+" else 1
+    const = unit
+    parts: list[str] = []
+    for x in (a, b):
+        if type(x) in _NUMBER:
+            const = const + x if op == "+" else const * x
+        elif type(x) is tuple and x[0] == op:
+            const = const + x[1] if op == "+" else const * x[1]
+            parts.extend(x[2])
+        else:
+            parts.append(_text(x))
+    if op == "*" and const == 0:
+        return const
+    if not parts:
+        return const
+    if len(parts) == 1 and const == unit:
+        return parts[0]
+    return op, const, tuple(sorted(parts))
+
+
+def _fold_pow(a: int | Fraction, b: int | Fraction) -> int | Fraction | None:
+    """常数乘方，结果不是有理数或过大时返回 None"""
+    if type(b) is Fraction and b.denominator != 1:
+        return None
+    b = int(b)
+    if a == 0 and b < 0:
+        return None
+    a = Fraction(a)
+    bits = max(a.numerator.bit_length(), a.denominator.bit_length())
+    if bits * abs(b) > MAX_POW_BITS:
+        return None
+    result = a ** b
+    return result.numerator if result.denominator == 1 else result
+
+
+def _combine(op: str, a: _Form, b: _Form) -> _Form:
+    """由子节点的规范形式得到运算 op 的规范形式"""
+    if op == "+" or op == "*":
+        return _flat(op, a, b)
+    both = type(a) in _NUMBER and type(b) in _NUMBER
+    if op == "-":
+        if both:
+            return a - b
+        if b == 0:
+            return a
+    elif op == "/":
+        if both and b != 0:
+            q = Fraction(a, b)
+            return q.numerator if q.denominator == 1 else q
+        if b == 1:
+            return a
+    elif op == "^":
+        if both and (folded := _fold_pow(a, b)) is not None:
+            return folded
+        if b == 1:
+            return a
+    return f"{op}({_text(a)},{_text(b)})"
+
+
+def _leaf(value: int | float | str) -> _Form:
+    if type(value) is float:
+        value = Fraction(value)
+        return value.numerator if value.denominator == 1 else value
+    return value
+
+
+def canonical(node: expr.Node) -> str:
+    """
+    规范形式的文本，交换加法、乘法的顺序或改写平凡常数得到的表达式有相同的规范形式
+    如 lg5 + lg2、lg2 + lg5 和 lg2 + (lg5 + 0)；log_{(1 + 1)} 8 和 log_2 8
+    不做真正的化简，log_2 8 和 3 的规范形式不同
+    """
+    if not _TAGS[node.base_type]:
+        return _text(_leaf(node.value))
+    forms: dict[int, _Form] = {}  # id(节点) -> 规范形式，共享的子树只算一次
+    stack: list[tuple[expr.Node, bool]] = [(node, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if not expanded:
+            if id(n) in forms:
+                continue
+            stack.append((n, True))
+            for child in (n.right, n.left):
+                if id(child) not in forms:
+                    if _TAGS[child.base_type]:
+                        stack.append((child, False))
+                    else:
+                        forms[id(child)] = _leaf(child.value)
+        else:
+            forms[id(n)] = _combine(_TAGS[n.base_type], forms[id(n.left)], forms[id(n.right)])
+    return _text(forms[id(node)])
+
+
+def canonical_key(node: expr.Node) -> bytes:
+    """规范形式的 16 字节摘要，用作判重的键"""
+    return blake2b(canonical(node).encode(), digest_size=16).digest()
+
+
+class DedupIndex:
+    """
+    已出现题目的索引，按 canonical_key 判重，每次查询为 O(1)
+    path 为 None 时只在内存中记录；否则已发放的题目保存在该 SQLite 文件中，
+    打开时全部载入内存，因此之前的试卷中出现过的题目也会被跳过
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._seen: set[bytes] = set()
+        self._db: "sqlite3.Connection | None" = None
+        if path is not None:
+            import sqlite3  # 只在需要持久化时载入
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS issued (key BLOB PRIMARY KEY, latex TEXT NOT NULL)")
+            self._seen.update(key for key, in self._db.execute("SELECT key FROM issued"))
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._seen
+
+    def add(self, key: bytes) -> bool:
+        """记录 key，返回它此前是否未出现过"""
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def unique(self, problems: Iterable[P]) -> Iterator[P]:
+        """跳过重复的题目，problems 中每项的第一个元素为表达式"""
+        for problem in problems:
+            if self.add(canonical_key(problem[0])):
+                yield problem
+
+    def issue(self, issued: Iterable[tuple[bytes, str]]) -> None:
+        """把 [(键, Latex 表达式), ...] 记为已发放，写入文件"""
+        issued = list(issued)
+        self._seen.update(key for key, _ in issued)
+        if self._db is not None:
+            with self._db:
+                self._db.executemany("INSERT OR IGNORE INTO issued VALUES (?, ?)", issued)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
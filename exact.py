@@ -0,0 +1,351 @@
+"""
+精确计算：把表达式的值表示为有理系数的有理分式
+变量为 e、π 以及各个素数的自然对数 ln p 和 ln π，
+于是 log_2 8 = 3、10^{lg 3} = 3、lg2 lg5 + lg^2 2 + lg5 = 1 等都能精确得到
+超出表示范围（如 ln(lg 2)、2^{1/2}）时相关函数返回 None
+"""
+from fractions import Fraction
+import math
+
+# 变量编号：素数 p 表示 ln p
+E = -2      # 自然常数 e
+PI = -1     # 圆周率
+LN_PI = 0   # ln π
+
+Mono = tuple[tuple[int, int], ...]  # ((变量, 指数), ...)，按变量升序
+Poly = dict[Mono, Fraction]
+
+MAX_TERMS = 256         # 分子分母的项数上限，超过则放弃精确计算
+MAX_BITS = 4096         # 有理数的位数上限
+SMALL_PRIMES_LIMIT = 10 ** 4  # 分解质因数时试除的上限
+
+
+class TooComplex(Exception):
+    """结果超出精确表示的范围"""
+
+
+def _mono_key(m: Mono) -> tuple:
+    """字典序单项式序（变量编号小者优先），与乘法相容"""
+    return tuple((-v, e) for v, e in m)
+
+
+def _mono_mul(a: Mono, b: Mono) -> Mono:
+    exps = dict(a)
+    for v, e in b:
+        exps[v] = exps.get(v, 0) + e
+    return tuple(sorted(exps.items()))
+
+
+def _mono_div(a: Mono, b: Mono) -> Mono | None:
+    exps = dict(a)
+    for v, e in b:
+        if exps.get(v, 0) < e:
+            return None
+        exps[v] -= e
+    return tuple(sorted((v, e) for v, e in exps.items() if e))
+
+
+def _add(p: Poly, q: Poly, scale: Fraction = Fraction(1)) -> Poly:
+    """p + scale * q"""
+    r = dict(p)
+    for m, c in q.items():
+        c = r.get(m, 0) + scale * c
+        if c:
+            r[m] = c
+        else:
+            r.pop(m, None)
+    return r
+
+
+def _mul(p: Poly, q: Poly) -> Poly:
+    r: Poly = {}
+    for m1, c1 in p.items():
+        for m2, c2 in q.items():
+            m = _mono_mul(m1, m2)
+            c = r.get(m, 0) + c1 * c2
+            if c:
+                r[m] = c
+            else:
+                r.pop(m)
+    if len(r) > MAX_TERMS:
+        raise TooComplex
+    return r
+
+
+def _scale(p: Poly, c: Fraction) -> Poly:
+    return {m: v * c for m, v in p.items()} if c else {}
+
+
+def _lead(p: Poly) -> tuple[Mono, Fraction]:
+    m = max(p, key=_mono_key)
+    return m, p[m]
+
+
+def _divide(p: Poly, q: Poly) -> Poly | None:
+    """多项式整除 p / q，不能整除时返回 None"""
+    qm, qc = _lead(q)
+    r = dict(p)
+    s: Poly = {}
+    while r:
+        rm, rc = _lead(r)
+        m = _mono_div(rm, qm)
+        if m is None:
+            return None
+        c = rc / qc
+        s[m] = s.get(m, 0) + c
+        r = _add(r, _mul({m: c}, q), Fraction(-1))
+    return s
+
+
+def _const(p: Poly) -> Fraction | None:
+    """常数多项式的值，否则为 None"""
+    if not p:
+        return Fraction(0)
+    if len(p) == 1 and () in p:
+        return p[()]
+    return None
+
+
+def _content(p: Poly, q: Poly) -> Mono:
+    """p 和 q 所有项的公共单项式因子"""
+    common: dict[int, int] | None = None
+    for m in (*p, *q):
+        exps = dict(m)
+        if common is None:
+            common = exps
+        else:
+            common = {v: min(e, exps[v]) for v, e in common.items() if v in exps}
+        if not common:
+            return ()
+    return tuple(sorted(common.items())) if common else ()
+
+
+class Exact:
+    """精确值 num / den，num 和 den 为多项式，den 的首项系数为 1"""
+    __slots__ = ("num", "den")
+
+    def __init__(self, num: Poly, den: Poly | None = None):
+        if den is None:
+            den = {(): Fraction(1)}
+        if not den:
+            raise ZeroDivisionError("Exact division by zero")
+        self.num, self.den = self._normalize(num, den)
+
+    @staticmethod
+    def _normalize(num: Poly, den: Poly) -> tuple[Poly, Poly]:
+        one: Poly = {(): Fraction(1)}
+        if not num:
+            return {}, one
+        if len(den) == 1 and () in den:
+            c = den[()]
+            return (num if c == 1 else _scale(num, 1 / c)), one
+        content = _content(num, den)
+        if content:
+            num = {_mono_div(m, content): c for m, c in num.items()}
+            den = {_mono_div(m, content): c for m, c in den.items()}
+        c = _const(den)
+        if c is not None:
+            return _scale(num, 1 / c), one
+        q = _divide(num, den)
+        if q is not None:
+            return q, one
+        q = _divide(den, num)
+        if q is not None:
+            num, den = one, q
+        if len(num) + len(den) > MAX_TERMS:
+            raise TooComplex
+        lc = _lead(den)[1]
+        return _scale(num, 1 / lc), _scale(den, 1 / lc)
+
+    @classmethod
+    def number(cls, value: int | float | Fraction) -> "Exact":
+        value = Fraction(value)
+        if value.numerator.bit_length() + value.denominator.bit_length() > MAX_BITS:
+            raise TooComplex
+        return cls({(): value} if value else {})
+
+    @classmethod
+    def symbol(cls, var: int, exp: int = 1) -> "Exact":
+        if exp >= 0:
+            return cls({((var, exp),) if exp else (): Fraction(1)})
+        return cls({(): Fraction(1)}, {((var, -exp),): Fraction(1)})
+
+    def as_fraction(self) -> Fraction | None:
+        """值为有理数时返回该有理数"""
+        if self.den == {(): 1}:
+            return _const(self.num)
+        return None
+
+    def is_zero(self) -> bool:
+        return not self.num
+
+    def __add__(self, other: "Exact") -> "Exact":
+        if self.den == other.den:
+            return Exact(_add(self.num, other.num), self.den)
+        return Exact(_add(_mul(self.num, other.den), _mul(other.num, self.den)), _mul(self.den, other.den))
+
+    def __neg__(self) -> "Exact":
+        return Exact(_scale(self.num, Fraction(-1)), self.den)
+
+    def __sub__(self, other: "Exact") -> "Exact":
+        return self + (-other)
+
+    def __mul__(self, other: "Exact") -> "Exact":
+        return Exact(_mul(self.num, other.num), _mul(self.den, other.den))
+
+    def __truediv__(self, other: "Exact") -> "Exact":
+        return Exact(_mul(self.num, other.den), _mul(self.den, other.num))
+
+    def __pow__(self, k: int) -> "Exact":
+        if k < 0:
+            return Exact(self.den, self.num) ** -k
+        f = self.as_fraction()
+        if f is not None:
+            if f and k * (f.numerator.bit_length() + f.denominator.bit_length()) > MAX_BITS:
+                raise TooComplex
+            return Exact.number(f ** k)
+        if k > 64:
+            raise TooComplex
+        num: Poly = {(): Fraction(1)}
+        den: Poly = {(): Fraction(1)}
+        for _ in range(k):
+            num = _mul(num, self.num)
+            den = _mul(den, self.den)
+        return Exact(num, den)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (int, Fraction)):
+            return self.as_fraction() == other
+        if not isinstance(other, Exact):
+            return NotImplemented
+        return not _add(_mul(self.num, other.den), _mul(other.num, self.den), Fraction(-1))
+
+    __hash__ = None  # 表示不唯一，请用 as_fraction() 作为键
+
+    def __float__(self) -> float:
+        return _eval(self.num) / _eval(self.den)
+
+    def __repr__(self) -> str:
+        f = self.as_fraction()
+        return f"Exact({f})" if f is not None else f"Exact({self.num!r} / {self.den!r})"
+
+
+def _eval(p: Poly) -> float:
+    def var(v: int) -> float:
+        if v == E:
+            return math.e
+        elif v == PI:
+            return math.pi
+        elif v == LN_PI:
+            return math.log(math.pi)
+        return math.log(v)
+    return sum(float(c) * math.prod(var(v) ** e for v, e in m) for m, c in p.items())
+
+
+def _factorize(n: int) -> dict[int, int] | None:
+    """分解正整数，含有过大素因子时返回 None"""
+    factors: dict[int, int] = {}
+    p = 2
+    while p * p <= n and p < SMALL_PRIMES_LIMIT:
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+        p += 1 if p == 2 else 2
+    if n > 1:
+        if n >= SMALL_PRIMES_LIMIT ** 2:
+            return None  # 剩余部分可能是合数，无法确定
+        factors[n] = factors.get(n, 0) + 1
+    return factors
+
+
+def factor_fraction(x: Fraction) -> dict[int, int] | None:
+    """正有理数的质因数分解，分母中的素数指数为负；含有过大素因子时返回 None"""
+    num = _factorize(x.numerator)
+    den = _factorize(x.denominator)
+    if num is None or den is None:
+        return None
+    for p, k in den.items():
+        num[p] = -k
+    return num
+
+
+def _monomial(x: Exact) -> tuple[Fraction, int, int] | None:
+    """把 x 表示为 c * e^a * π^b（c > 0），不能表示时返回 None"""
+    if len(x.num) != 1 or len(x.den) != 1:
+        return None
+    (nm, nc), = x.num.items()
+    (dm, dc), = x.den.items()
+    exps = dict(nm)
+    for v, e in dm:
+        exps[v] = exps.get(v, 0) - e
+    if any(v not in (E, PI) for v, e in exps.items() if e):
+        return None
+    c = nc / dc
+    if c <= 0:
+        return None
+    return c, exps.get(E, 0), exps.get(PI, 0)
+
+
+def ln(x: Exact) -> Exact | None:
+    """ln x，x 须为 c * e^a * π^b 的形式"""
+    mono = _monomial(x)
+    if mono is None:
+        return None
+    c, a, b = mono
+    factors = factor_fraction(c)
+    if factors is None:
+        return None
+    poly: Poly = {((p, 1),): Fraction(k) for p, k in factors.items()}
+    if a:
+        poly[()] = Fraction(a)
+    if b:
+        poly[((LN_PI, 1),)] = Fraction(b)
+    return Exact(poly)
+
+
+def exp(x: Exact) -> Exact | None:
+    """e^x，x 须为 Σ k_p ln p + k + k' ln π 且各系数能给出有理数或整数次幂"""
+    if x.den != {(): 1}:
+        return None
+    c = Fraction(1)
+    result = Exact.number(1)
+    for m, k in x.num.items():
+        if m == ():
+            if k.denominator != 1:
+                return None
+            result = result * Exact.symbol(E, int(k))
+        elif len(m) == 1 and m[0][1] == 1:
+            v = m[0][0]
+            if k.denominator != 1:
+                return None
+            if v == LN_PI:
+                result = result * Exact.symbol(PI, int(k))
+            else:
+                if abs(k) * v.bit_length() > MAX_BITS:
+                    raise TooComplex
+                c *= Fraction(v) ** int(k)
+        else:
+            return None
+    return result * Exact.number(c)
+
+
+def log(base: Exact, arg: Exact) -> Exact | None:
+    """log_base arg；底数为 1 或参数不是正的 c * e^a * π^b 时返回 None"""
+    ln_base = ln(base)
+    ln_arg = ln(arg)
+    if ln_base is None or ln_arg is None or ln_base.is_zero():
+        return None
+    return ln_arg / ln_base
+
+
+def power(base: Exact, exponent: Exact) -> Exact | None:
+    """base ^ exponent，结果不能精确表示或无定义时返回 None"""
+    k = exponent.as_fraction()
+    if k is not None and k.denominator == 1:
+        if base.is_zero() and k < 0:
+            return None
+        return base ** int(k)
+    ln_base = ln(base)
+    if ln_base is None:
+        return None
+    return exp(exponent * ln_base)
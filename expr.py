@@ -1,41 +1,163 @@
-"""表达式树相关"""
+"""表达式树相关；节点构造后不可修改，各项缓存因此不会过期"""
 from abc import ABC, abstractmethod
+from typing import ClassVar, NamedTuple
+from weakref import WeakValueDictionary
 import math
+import exact
+
+
+class Metrics(NamedTuple):
+    """表达式树的结构指标，无需渲染即可得到"""
+    nodes: int          # 节点总数
+    depth: int          # 深度，单个叶子为 1
+    logs: int           # Log 节点个数
+    base_changes: int   # 换底次数，即分子分母均为对数的除法个数
+    latex_len: int      # Latex 表达式的长度，与 len(str(node)) 相同
+
+
+_UNSET = object()
 
 
 class Node(ABC):
+    __slots__ = ("prio", "_latex", "_metrics", "_calc_cache", "_exact_cache", "_ln_cache", "_frozen", "__weakref__")
+
     prio: int  # 运算符优先级，越高表示越先计算
+    base_type: ClassVar[type["Node"]]  # 所属的 expr 节点类；Arena 视图等子类沿用它，复制节点时按它构造
+    _latex: str | None  # 缓存的 Latex 表达式
+    _metrics: Metrics | None  # 缓存的结构指标
+    _calc_cache: float | None  # 缓存的浮点值
+    _exact_cache: "exact.Exact | None | object"  # 缓存的精确值，未计算时为 _UNSET
+    _ln_cache: "exact.Exact | None | object"  # 缓存的 ln 值的精确表示，同上
+    _frozen: bool  # 是否被 Interner 收录
 
     def __init__(self, prio: int):
         self.prio = prio
+        self._frozen = False
+        self.invalidate()
 
-    @abstractmethod
     def calc(self) -> float:
+        """浮点数值，结果会被缓存"""
+        if self._calc_cache is None:
+            self._fill("_calc_cache", None, "_calc")
+        return self._calc_cache
+
+    @abstractmethod
+    def _calc(self) -> float:
         ...
 
+    def exact(self) -> "exact.Exact | None":
+        """精确值，不能精确表示（如 lg 3 的对数）或无定义时为 None，结果会被缓存"""
+        if self._exact_cache is _UNSET:
+            self._fill("_exact_cache", _UNSET, "_try_exact")
+        return self._exact_cache
+
     @abstractmethod
+    def _exact(self) -> "exact.Exact | None":
+        ...
+
+    def _try_exact(self) -> "exact.Exact | None":
+        try:
+            return self._exact()
+        except (ZeroDivisionError, exact.TooComplex):
+            return None
+
+    def _ln_exact(self) -> "exact.Exact | None":
+        """ln 值的精确表示，结果会被缓存；与 exact() 一样自底向上填充，深树也不会递归"""
+        if self._ln_cache is _UNSET:
+            self._fill("_ln_cache", _UNSET, "_try_ln")
+        return self._ln_cache
+
+    def _ln(self) -> "exact.Exact | None":
+        """乘积、商和乘方按对数法则展开，不必先算出真数；其余节点先算出精确值再取对数"""
+        value = self.exact()
+        return None if value is None else exact.ln(value)
+
+    def _try_ln(self) -> "exact.Exact | None":
+        try:
+            return self._ln()
+        except (ZeroDivisionError, exact.TooComplex):
+            return None
+
+    def _fill(self, slot: str, missing: object, method: str) -> None:
+        """
+        用显式栈后序遍历本节点的子树，自底向上为缓存 slot 仍为 missing 的节点填入 节点.method() 的结果
+        子节点总是先于父节点算好，于是 method 中对子节点的调用直接命中缓存，
+        任意深的树都不会递归，已有缓存的子树整个跳过
+        """
+        stack: list[tuple[Node, bool]] = [(self, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if getattr(n, slot) is not missing:
+                continue  # 共享的子树已经算过
+            if expanded or not isinstance(n, BinOp):
+                setattr(n, slot, getattr(n, method)())
+            else:
+                stack.append((n, True))
+                stack.append((n.right, False))
+                stack.append((n.left, False))
+
+    def invalidate(self) -> None:
+        """清空本节点的缓存；节点构造后不可修改，缓存不会过期，只有基准测试需要手动清空"""
+        self._latex = None
+        self._metrics = None
+        self._calc_cache = None
+        self._exact_cache = _UNSET
+        self._ln_cache = _UNSET
+
+    def metrics(self) -> Metrics:
+        """自底向上计算结构指标，结果会被缓存"""
+        if self._metrics is None:
+            self._fill("_metrics", None, "_measure")
+        return self._metrics
+
+    @abstractmethod
+    def _measure(self) -> Metrics:
+        ...
+
     def __str__(self) -> str:
-        """转换为 Latex 表达式"""
+        """转换为 Latex 表达式，结果会被缓存"""
+        if self._latex is None:
+            self._fill("_latex", None, "_render")
+        return self._latex
+
+    @abstractmethod
+    def _latex_parts(self) -> list[str]:
+        """组成本节点 Latex 表达式的各个片段，由 __str__ 一次性拼接"""
         ...
 
+    def _render(self) -> str:
+        return "".join(self._latex_parts())
+
 
-def _br(node: Node, target_prio: int) -> str:
-    """在必要时添加括号"""
+def _br(node: Node, target_prio: int) -> tuple[str, ...]:
+    """在必要时添加括号，返回待拼接的片段"""
     if node.prio < target_prio:
-        return f"\\left({node}\\right)"
+        return ("\\left(", str(node), "\\right)")
     else:
-        return str(node)
+        return (str(node),)
+
+
+def _br_len(node: Node, target_prio: int) -> int:
+    """_br 结果的长度，不需要渲染"""
+    if node.prio < target_prio:
+        return node.metrics().latex_len + 13  # len("\\left(") + len("\\right)")
+    else:
+        return node.metrics().latex_len
 
 
 class Value(Node):
     """单个数字节点，应作为叶子节点"""
-    value: int | float | str
+    __slots__ = ("_value",)
 
     def __init__(self, value: int | float | str):
         super().__init__(100)
-        self.value = value
+        self._value = value
 
-    def calc(self) -> float:
+    @property
+    def value(self) -> int | float | str:
+        return self._value
+
+    def _calc(self) -> float:
         if isinstance(self.value, str):
             if self.value == "e":
                 return math.e
@@ -45,106 +167,329 @@ class Value(Node):
                 raise ValueError(f"Unknown value: {self.value}")
         return self.value
 
+    def _exact(self) -> exact.Exact | None:
+        if self.value == "e":
+            return exact.Exact.symbol(exact.E)
+        elif self.value == "pi":
+            return exact.Exact.symbol(exact.PI)
+        elif isinstance(self.value, str):
+            return None
+        return exact.Exact.number(self.value)
+
     def is_num(self) -> bool:
         return isinstance(self.value, (int, float))
 
-    def __str__(self) -> str:
+    def _latex_parts(self) -> list[str]:
         if self.value == "e":
-            return "\\text{e}"
+            return ["\\text{e}"]
         elif self.value == "pi":
-            return "\\pi"
-        return str(self.value)
+            return ["\\pi"]
+        return [str(self.value)]
+
+    def _measure(self) -> Metrics:
+        return Metrics(1, 1, 0, 0, len(str(self)))
 
 
 class BinOp(Node):
-    left: Node
-    right: Node
+    __slots__ = ("_left", "_right")
 
     def __init__(self, left: Node, right: Node, prio: int):
         super().__init__(prio)
-        self.left = left
-        self.right = right
+        self._left = left
+        self._right = right
+
+    # 子节点只读：父节点的缓存依赖子树，修改子树会让所有祖先的缓存过期，需要换子节点时用 with_children
+    @property
+    def left(self) -> Node:
+        return self._left
+
+    @property
+    def right(self) -> Node:
+        return self._right
+
+    def _exact_children(self) -> tuple[exact.Exact, exact.Exact] | None:
+        a = self.left.exact()
+        b = self.right.exact()
+        if a is None or b is None:
+            return None
+        return a, b
+
+    def with_children(self, left: Node, right: Node) -> "BinOp":
+        """同类型、换了子节点的新节点，本节点保持不变；Arena 视图得到普通的 expr 节点"""
+        return self.base_type(left, right)
+
+    def _measure(self) -> Metrics:
+        l = self.left.metrics()
+        r = self.right.metrics()
+        return Metrics(
+            l.nodes + r.nodes + 1,
+            max(l.depth, r.depth) + 1,
+            l.logs + r.logs + isinstance(self, Log),
+            l.base_changes + r.base_changes
+                + (isinstance(self, Div) and isinstance(self.left, Log) and isinstance(self.right, Log)),
+            self._latex_len()
+        )
+
+    @abstractmethod
+    def _latex_len(self) -> int:
+        """本节点 Latex 表达式的长度，由子节点的指标推出"""
+        ...
 
 
 class Add(BinOp):
+    __slots__ = ()
+
     def __init__(self, left: Node, right: Node):
         super().__init__(left, right, 1)
 
-    def calc(self) -> float:
+    def _calc(self) -> float:
         return self.left.calc() + self.right.calc()
 
-    def __str__(self) -> str:
-        return f"{_br(self.left, self.prio)} + {_br(self.right, self.prio)}"
+    def _exact(self) -> exact.Exact | None:
+        ab = self._exact_children()
+        return None if ab is None else ab[0] + ab[1]
+
+    def _latex_parts(self) -> list[str]:
+        return [*_br(self.left, self.prio), " + ", *_br(self.right, self.prio)]
+
+    def _latex_len(self) -> int:
+        return _br_len(self.left, self.prio) + 3 + _br_len(self.right, self.prio)
 
 
 class Sub(BinOp):
+    __slots__ = ()
+
     def __init__(self, left: Node, right: Node):
         super().__init__(left, right, 1)
 
-    def calc(self) -> float:
+    def _calc(self) -> float:
         return self.left.calc() - self.right.calc()
 
-    def __str__(self) -> str:
-        return f"{_br(self.left, self.prio)} - {_br(self.right, self.prio)}"
+    def _exact(self) -> exact.Exact | None:
+        ab = self._exact_children()
+        return None if ab is None else ab[0] - ab[1]
+
+    # 减数为加减法时必须加括号：a - (b + c) 不能写成 a - b + c
+    def _latex_parts(self) -> list[str]:
+        return [*_br(self.left, self.prio), " - ", *_br(self.right, self.prio + 1)]
+
+    def _latex_len(self) -> int:
+        return _br_len(self.left, self.prio) + 3 + _br_len(self.right, self.prio + 1)
 
 
 class Mul(BinOp):
+    __slots__ = ()
+
     def __init__(self, left: Node, right: Node):
         super().__init__(left, right, 2)
 
-    def calc(self) -> float:
+    def _calc(self) -> float:
         return self.left.calc() * self.right.calc()
 
-    def __str__(self) -> str:
+    def _exact(self) -> exact.Exact | None:
+        ab = self._exact_children()
+        return None if ab is None else ab[0] * ab[1]
+
+    def _ln(self) -> exact.Exact | None:
+        a = self.left._ln_exact()
+        b = self.right._ln_exact()
+        if a is None or b is None:
+            return super()._ln()
+        return a + b
+
+    def cross_mul(self) -> bool:
+        """是否需要显式写出乘号"""
         p = self.right
         while isinstance(p, Pow) or isinstance(p, Mul):
             p = p.left
-        cross_mul = (isinstance(p, Value) and p.is_num()  # 两数相乘用乘号
+        return (isinstance(p, Value) and p.is_num()  # 两数相乘用乘号
             or (isinstance(p, Div) and isinstance(p.left, Value) and isinstance(p.right, Value))) # 避免和带分数混淆
-        if cross_mul:
-            return f"{_br(self.left, self.prio)} \\times {self.right}"
+
+    def _latex_parts(self) -> list[str]:
+        if self.cross_mul():
+            return [*_br(self.left, self.prio), " \\times ", str(self.right)]
+        else:
+            return [*_br(self.left, self.prio), " ", *_br(self.right, self.prio)]
+
+    def _latex_len(self) -> int:
+        if self.cross_mul():
+            return _br_len(self.left, self.prio) + 8 + self.right.metrics().latex_len
         else:
-            return f"{_br(self.left, self.prio)} {_br(self.right, self.prio)}"
+            return _br_len(self.left, self.prio) + 1 + _br_len(self.right, self.prio)
 
 
 class Div(BinOp):
+    __slots__ = ()
+
     def __init__(self, left: Node, right: Node):
         super().__init__(left, right, 2)
 
-    def calc(self) -> float:
+    def _calc(self) -> float:
         return self.left.calc() / self.right.calc()
 
-    def __str__(self) -> str:
-        return f"\\frac{{{self.left}}}{{{self.right}}}"
+    def _exact(self) -> exact.Exact | None:
+        ab = self._exact_children()
+        return None if ab is None or ab[1].is_zero() else ab[0] / ab[1]
+
+    def _ln(self) -> exact.Exact | None:
+        a = self.left._ln_exact()
+        b = self.right._ln_exact()
+        if a is None or b is None:
+            return super()._ln()
+        return a - b
+
+    def _latex_parts(self) -> list[str]:
+        return ["\\frac{", str(self.left), "}{", str(self.right), "}"]
+
+    def _latex_len(self) -> int:
+        return self.left.metrics().latex_len + self.right.metrics().latex_len + 9
 
 
 class Pow(BinOp):
+    __slots__ = ()
+
     def __init__(self, base: Node, exp: Node):
         super().__init__(base, exp, 4)
 
-    def calc(self) -> float:
-        return self.left.calc() ** self.right.calc()
+    def _calc(self) -> float:
+        # 先转为浮点数，避免整数乘方得到天文数字（如 3^{5^{100}}）导致长时间计算
+        value = float(self.left.calc()) ** self.right.calc()
+        if isinstance(value, complex):  # 负数的分数次幂，不在实数范围内
+            raise ValueError("Complex power")
+        return value
+
+    def _exact(self) -> exact.Exact | None:
+        b = self.right.exact()
+        if b is None:
+            return None
+        k = b.as_fraction()
+        if k is not None and k.denominator == 1:
+            a = self.left.exact()
+            return None if a is None else exact.power(a, b)
+        ln_a = self.left._ln_exact()
+        return None if ln_a is None else exact.exp(b * ln_a)
+
+    def _ln(self) -> exact.Exact | None:
+        b = self.right.exact()
+        a = self.left._ln_exact()
+        if a is None or b is None:
+            return super()._ln()
+        return b * a
+
+    def _latex_parts(self) -> list[str]:
+        if isinstance(self.left, Log):
+            return [self.left.func_name(), "^{", str(self.right), "}{", *_br(self.left.right, 3), "}"]
+        return ["{", *_br(self.left, 5), "} ^ {", str(self.right), "}"]
 
-    def __str__(self) -> str:
+    def _latex_len(self) -> int:
         if isinstance(self.left, Log):
-            return f"{self.left.func_name()}^{{{self.right}}}{{{_br(self.left.right, 3)}}}"
-        return f"{{{_br(self.left, 5)}}} ^ {{{self.right}}}"
+            return self.left.func_name_len() + self.right.metrics().latex_len + _br_len(self.left.right, 3) + 5
+        return _br_len(self.left, 5) + self.right.metrics().latex_len + 7
 
 
 class Log(BinOp):
+    __slots__ = ()
+
     def __init__(self, base: Node, arg: Node):
         super().__init__(base, arg, 3)
 
-    def calc(self) -> float:
+    def _calc(self) -> float:
         return math.log(self.right.calc(), self.left.calc())
 
+    def _exact(self) -> exact.Exact | None:
+        ln_base = self.left._ln_exact()
+        ln_arg = self.right._ln_exact()
+        if ln_base is None or ln_arg is None or ln_base.is_zero():
+            return None
+        return ln_arg / ln_base
+
     def func_name(self) -> str:
         if isinstance(self.left, Value):
             if self.left.value == 10:
                 return "\\lg"
             elif self.left.value == "e":
                 return "\\ln"
-        return f"\\log_{{{_br(self.left, 5)}}}"
-
-    def __str__(self) -> str:
-        return f"{self.func_name()}{{{_br(self.right, 3)}}}"
+        return "".join(("\\log_{", *_br(self.left, 5), "}"))
+
+    def func_name_len(self) -> int:
+        """func_name() 的长度，不需要渲染"""
+        if isinstance(self.left, Value) and self.left.value in (10, "e"):
+            return 3
+        return _br_len(self.left, 5) + 7
+
+    def _latex_parts(self) -> list[str]:
+        return [self.func_name(), "{", *_br(self.right, 3), "}"]
+
+    def _latex_len(self) -> int:
+        return self.func_name_len() + _br_len(self.right, 3) + 2
+
+
+Value.base_type = Value
+Add.base_type = Add
+Sub.base_type = Sub
+Mul.base_type = Mul
+Div.base_type = Div
+Pow.base_type = Pow
+Log.base_type = Log
+
+
+class Interner:
+    """
+    结构共享表（hash-consing）：结构相同的子树只保留一个实例
+    节点本身不可修改，收录的节点被标记为冻结，可以放心地在多棵树之间共享
+    表中只保存弱引用，不再被使用的节点会自动移除
+    """
+
+    def __init__(self):
+        self._table: WeakValueDictionary[tuple, Node] = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    @staticmethod
+    def _key(node: Node) -> tuple:
+        if isinstance(node, BinOp):
+            # 子节点已被收录，同一结构的子节点是同一个对象，按对象本身比较即可
+            return (node.base_type, node.left, node.right)
+        return (Value, type(node.value), node.value)
+
+    def _add(self, key: tuple, node: Node) -> Node:
+        node._frozen = True
+        self._table[key] = node
+        return node
+
+    def value(self, value: int | float | str) -> Value:
+        """收录一个数字节点"""
+        key = (Value, type(value), value)
+        node = self._table.get(key)
+        return node if node is not None else self._add(key, Value(value))
+
+    def op(self, cls: type, left: Node, right: Node) -> BinOp:
+        """收录一个运算节点，left 和 right 必须已被本表收录"""
+        key = (cls, left, right)
+        node = self._table.get(key)
+        return node if node is not None else self._add(key, cls(left, right))
+
+    def owns(self, node: Node) -> bool:
+        """node 是否就是本表收录的实例"""
+        return node._frozen and self._table.get(self._key(node)) is node
+
+    def intern(self, node: Node) -> Node:
+        """自底向上收录整棵树，返回结构相同的共享实例；已收录的子树直接复用"""
+        done: dict[int, Node] = {}
+        stack: list[tuple[Node, bool]] = [(node, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if id(n) in done:
+                continue
+            if self.owns(n):
+                done[id(n)] = n
+            elif isinstance(n, Value):
+                done[id(n)] = self.value(n.value)
+            elif not expanded:
+                stack.append((n, True))
+                stack.append((n.right, False))
+                stack.append((n.left, False))
+            else:
+                done[id(n)] = self.op(n.base_type, done[id(n.left)], done[id(n.right)])
+        return done[id(node)]
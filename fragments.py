@@ -0,0 +1,135 @@
+"""
+子树片段库：按数值和用途索引的现成子树，如各种等于 1 的写法
+片段在加入时精确核对数值，并被冻结后在所有题目间共享；make_chaos 写时复制，取出的片段无需复制
+默认片段库在首次使用时才载入，核对结果缓存在磁盘上
+用户可以用 library().add(...) 加入自己的恒等式，不必修改策略代码
+"""
+from fractions import Fraction
+from itertools import accumulate
+from random import Random
+import exact
+import expr
+import tables
+
+# 用途，即使用片段的策略:
+LOG = "log"                 # _replace_constant_with_logarithm: 常数的对数写法
+IDENTITY = "identity"       # _introduce_identity_operations: 用于 *1、+0 和分子分母同乘的 1 和 0
+POLYNOMIAL = "polynomial"   # _introduce_polynomial_log_forms: 对数多项式
+POLYNOMIAL_FACTOR = "polynomial_factor"  # _introduce_polynomial_log_forms: 加法表达式外乘的因子
+
+
+class FragmentLibrary:
+    """按 (用途, 数值) 索引的片段库，抽取时按权重随机选择"""
+
+    def __init__(self):
+        self._interner = expr.Interner()
+        self._fragments: dict[tuple[str, Fraction], list[expr.Node]] = {}
+        self._weights: dict[tuple[str, Fraction], list[float]] = {}
+        self._cum_weights: dict[tuple[str, Fraction], list[float]] = {}
+
+    def add(self, node: expr.Node, value: int | Fraction, kind: str, weight: float = 1.0) -> expr.Node:
+        """
+        加入一个值为 value 的片段，返回收录后的冻结实例
+        片段的精确值与 value 不符或无法精确计算时抛出 ValueError
+        """
+        value = Fraction(value)
+        actual = node.exact()
+        if actual is None or actual != value:
+            raise ValueError(f"Fragment {node} does not equal {value}")
+        return self._insert(node, value, kind, weight)
+
+    def _insert(self, node: expr.Node, value: Fraction, kind: str, weight: float) -> expr.Node:
+        """加入已核对过的片段"""
+        node = self._interner.intern(node)
+        key = (kind, value)
+        self._fragments.setdefault(key, []).append(node)
+        self._weights.setdefault(key, []).append(weight)
+        self._cum_weights.pop(key, None)
+        return node
+
+    def entries(self) -> list[tuple[str, Fraction, float, expr.Node]]:
+        """全部片段 [(用途, 数值, 权重, 片段), ...]，可用 from_entries 还原"""
+        return [(kind, value, w, node) for (kind, value), nodes in self._fragments.items()
+                for node, w in zip(nodes, self._weights[kind, value])]
+
+    @classmethod
+    def from_entries(cls, entries: list[tuple[str, Fraction, float, expr.Node]]) -> "FragmentLibrary":
+        """由 entries() 的结果还原，片段视为已核对"""
+        lib = cls()
+        for kind, value, weight, node in entries:
+            lib._insert(node, value, kind, weight)
+        return lib
+
+    def has(self, value: int | float | Fraction, kind: str) -> bool:
+        return (kind, value) in self._fragments
+
+    def fragments(self, value: int | float | Fraction, kind: str) -> list[expr.Node]:
+        """值为 value 的全部片段"""
+        return list(self._fragments.get((kind, value), ()))
+
+    def choice(self, value: int | float | Fraction, kind: str, rng: Random) -> expr.Node:
+        """按权重随机选择一个值为 value 的片段，没有时抛出 KeyError"""
+        key = (kind, value)
+        nodes = self._fragments[key]
+        cum_weights = self._cum_weights.get(key)
+        if cum_weights is None:
+            cum_weights = self._cum_weights[key] = list(accumulate(self._weights[key]))
+        return rng.choices(nodes, cum_weights=cum_weights)[0]
+
+
+def _lg(x: int) -> expr.Node:
+    return expr.Log(expr.Value(10), expr.Value(x))
+
+
+def _build() -> FragmentLibrary:
+    """默认片段，即原先各策略每次调用时重建的候选列表；权重保持原先的抽取概率"""
+    V = expr.Value
+    lib = FragmentLibrary()
+
+    for b in (2, 3, 5, 10):
+        lib.add(expr.Log(V(b), V(b)), 1, LOG)
+    # lg5 + lg2；原策略中误写为 log_2 5 + log_5 2，值不为 1，总被验证拒绝
+    lib.add(expr.Add(_lg(5), _lg(2)), 1, LOG)
+    for b, x in ((2, 4), (3, 9), (5, 25)):
+        lib.add(expr.Log(V(b), V(x)), 2, LOG)
+    lib.add(expr.Mul(V(2), expr.Log(V(2), V(2))), 2, LOG)
+    lib.add(expr.Add(expr.Log(V(2), V(2)), expr.Log(V(2), V(2))), 2, LOG)
+    lib.add(expr.Log(V(2), V(1)), 0, LOG)
+    lib.add(expr.Sub(expr.Log(V(2), V(4)), expr.Log(V(2), V(4))), 0, LOG)
+
+    lib.add(V(1), 1, IDENTITY)
+    lib.add(expr.Div(V(2), V(2)), 1, IDENTITY)
+    lib.add(expr.Div(V(3), V(3)), 1, IDENTITY)
+    for k in range(2, 6):
+        lib.add(expr.Pow(V(1), V(k)), 1, IDENTITY, 1 / 4)
+    lib.add(expr.Log(V(2), V(2)), 1, IDENTITY)
+    lib.add(expr.Log(V(3), V(3)), 1, IDENTITY)
+    lib.add(expr.Add(V(1), V(0)), 1, IDENTITY)
+    lib.add(expr.Sub(V(2), V(1)), 1, IDENTITY)
+    lib.add(V(0), 0, IDENTITY)
+    lib.add(expr.Sub(V(2), V(2)), 0, IDENTITY)
+    lib.add(expr.Sub(V(3), V(3)), 0, IDENTITY)
+    for k in range(2, 6):
+        lib.add(expr.Mul(V(0), V(k)), 0, IDENTITY, 1 / 4)
+    for k in range(1, 6):
+        lib.add(expr.Div(V(0), V(k)), 0, IDENTITY, 1 / 5)
+
+    # lg2 lg5 + lg^2 2 + lg5、lg2 lg5 + lg^2 5 + lg2 和 lg^2 2 + lg^2 5 + 2 lg5 lg2，值都为 1
+    lib.add(expr.Add(expr.Add(expr.Mul(_lg(2), _lg(5)), expr.Pow(_lg(2), V(2))), _lg(5)), 1, POLYNOMIAL)
+    lib.add(expr.Add(expr.Add(expr.Mul(_lg(2), _lg(5)), expr.Pow(_lg(5), V(2))), _lg(2)), 1, POLYNOMIAL)
+    lib.add(expr.Add(expr.Add(expr.Mul(_lg(2), _lg(2)), expr.Mul(_lg(5), _lg(5))),
+                     expr.Mul(expr.Mul(V(2), _lg(5)), _lg(2))), 1, POLYNOMIAL)
+    lib.add(expr.Add(_lg(2), _lg(5)), 1, POLYNOMIAL_FACTOR)
+    return lib
+
+
+_library: FragmentLibrary | None = None
+
+
+def library() -> FragmentLibrary:
+    """默认片段库，首次调用时载入；核对过的片段缓存在磁盘上，见 tables.py"""
+    global _library
+    if _library is None:
+        key = tables.sources_key(__file__, expr.__file__, exact.__file__)
+        _library = FragmentLibrary.from_entries(tables.cached("fragments", key, lambda: _build().entries()))
+    return _library
@@ -0,0 +1,172 @@
+"""解析 expr 输出的 Latex 表达式，以及从已有的试卷文件中读回题目和答案"""
+from fractions import Fraction
+from typing import Iterable, Iterator
+import re
+import expr
+
+# 记号：数、命令、单个符号；其他非空白字符单独成为一个记号，由解析器报错
+_TOKEN = re.compile(r"-?\d+(?:\.\d+)?(?:e[-+]?\d+)?|\\left\(|\\right\)|\\frac|\\log_|\\lg|\\ln"
+                    r"|\\times|\\text\{e\}|\\pi|\S")
+
+# 可以作为乘法因子开头的记号（数除外），用于识别省略乘号的乘法
+_FACTOR_START = {"\\left(", "\\frac", "\\log_", "\\lg", "\\ln", "\\text{e}", "\\pi", "{"}
+
+
+class ParseError(ValueError):
+    """输入不是 expr 能输出的 Latex 表达式"""
+
+
+def _is_num(token: str) -> bool:
+    return token[:1].isdigit() or token[:1] == "-" and len(token) > 1
+
+
+class _Parser:
+    """
+    递归下降解析，按 expr 中的优先级分层：
+        sum    := term ((+ | -) term)*
+        term   := factor ((\\times)? factor)*
+        factor := 数 | \\text{e} | \\pi | \\left( sum \\right) | \\frac{sum}{sum}
+                | {sum} ^ {sum} | 对数 | 对数^{sum}{sum}
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _TOKEN.findall(text)
+        self.tokens.append("")  # 结束标记
+        self.pos = 0
+
+    def next(self) -> str:
+        token = self.tokens[self.pos]
+        if not token:
+            raise ParseError(f"Unexpected end of input: {self.text!r}")
+        self.pos += 1
+        return token
+
+    def expect(self, token: str) -> None:
+        got = self.next()
+        if got != token:
+            raise ParseError(f"Expected {token!r}, got {got!r} in {self.text!r}")
+
+    def parse(self) -> expr.Node:
+        node = self.sum()
+        if self.tokens[self.pos]:
+            raise ParseError(f"Unexpected {self.tokens[self.pos]!r} in {self.text!r}")
+        return node
+
+    def sum(self) -> expr.Node:
+        node = self.term()
+        while (token := self.tokens[self.pos]) == "+" or token == "-":
+            self.pos += 1
+            node = (expr.Add if token == "+" else expr.Sub)(node, self.term())
+        return node
+
+    def term(self) -> expr.Node:
+        node = self.factor()
+        while True:
+            token = self.tokens[self.pos]
+            if token == "\\times":
+                self.pos += 1
+            elif token not in _FACTOR_START and not _is_num(token):
+                return node
+            node = expr.Mul(node, self.factor())
+
+    def braced(self) -> expr.Node:
+        self.expect("{")
+        node = self.sum()
+        self.expect("}")
+        return node
+
+    def factor(self) -> expr.Node:
+        token = self.next()
+        if _is_num(token):
+            return expr.Value(float(token) if "." in token or "e" in token else int(token))
+        elif token == "\\text{e}":
+            return expr.Value("e")
+        elif token == "\\pi":
+            return expr.Value("pi")
+        elif token == "\\left(":
+            node = self.sum()
+            self.expect("\\right)")
+            return node
+        elif token == "\\frac":
+            return expr.Div(self.braced(), self.braced())
+        elif token == "{":
+            base = self.sum()
+            self.expect("}")
+            self.expect("^")
+            return expr.Pow(base, self.braced())
+        elif token == "\\lg" or token == "\\ln" or token == "\\log_":
+            if token == "\\log_":
+                base = self.braced()
+            else:
+                base = expr.Value(10 if token == "\\lg" else "e")
+            if self.tokens[self.pos] == "^":  # \lg^{2}{x} 表示 (\lg x)^2
+                self.pos += 1
+                exp = self.braced()
+                return expr.Pow(expr.Log(base, self.braced()), exp)
+            return expr.Log(base, self.braced())
+        raise ParseError(f"Unexpected {token!r} in {self.text!r}")
+
+
+def parse(text: str) -> expr.Node:
+    """把 str(node) 的结果解析回表达式树，str(parse(s)) == s"""
+    return _Parser(text).parse()
+
+
+def parse_answer(text: str) -> int | Fraction:
+    """解析答案，可以是整数、a/b 或 \\frac{a}{b} 等有理数的 Latex 表达式"""
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return Fraction(text)
+    except ValueError:
+        pass
+    value = parse(text).exact()
+    ans = value.as_fraction() if value is not None else None
+    if ans is None:
+        raise ParseError(f"Answer is not a rational number: {text!r}")
+    return ans.numerator if ans.denominator == 1 else ans
+
+
+_ITEM = re.compile(r"\\item \$ (.*) = \\underline\{\\hspace\{2cm\}\} \$")
+
+
+def _answer_line(line: str) -> list[int | Fraction] | None:
+    """若 line 是以分号分隔的一行答案则返回这些答案"""
+    parts = [a for a in line.split(";") if a.strip()]
+    if not parts or line.startswith("\\item"):
+        return None
+    try:
+        return [parse_answer(a) for a in parts]
+    except ValueError:
+        return None
+
+
+def iter_problems(lines: Iterable[str]) -> Iterator[tuple[expr.Node, int | Fraction | None]]:
+    """
+    逐行读取试卷（main 的输出，可以是多份试卷连在一起的大文件），依次产出 (题目, 答案)
+    题目之后以分号分隔的各行为答案；答案区在题目之后，因此每份试卷的题目会暂存到读完它的答案为止
+    缺少答案时为 None
+    """
+    items: list[expr.Node] = []
+    answers: list[int | Fraction] = []
+    for line in lines:
+        if m := _ITEM.match(line):
+            if answers:  # 上一份试卷结束
+                yield from _pair(items, answers)
+                items, answers = [], []
+            items.append(parse(m.group(1)))
+        elif line.startswith("\\end{document}"):
+            yield from _pair(items, answers)
+            items, answers = [], []
+        elif items and (row := _answer_line(line)) is not None:
+            answers.extend(row)
+    yield from _pair(items, answers)
+
+
+def _pair(items: list[expr.Node], answers: list) -> Iterator[tuple[expr.Node, int | Fraction | None]]:
+    for i, node in enumerate(items):
+        yield node, answers[i] if i < len(answers) else None
@@ -1,11 +1,32 @@
-from random import choice, randint
-from chaos import make_chaos
+from fractions import Fraction
+from itertools import islice
+from random import Random
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Sequence
+import sys
+import chaos
+from chaos import make_chaos, make_targeted
+from dedup import DedupIndex, canonical_key
+from verify import Verifier
 import expr
 
-def gen_ans() -> tuple[expr.Node, int]:
-    # 生成一个友好的单项式答案
-    base = choice([2, 3, 4, 5, 10, 'e'])
-    exp = randint(1, 4)
+if TYPE_CHECKING:  # 只在用到时才载入 answers 和 concurrent.futures
+    from concurrent.futures import Executor
+    from answers import AnswerSpace
+
+Problem = tuple[expr.Node, int | Fraction]  # (题目, 答案)，答案空间中可能有分数答案
+
+COUNT = 100          # 每份试卷的题目数量
+BAND = (130, 210)    # 题目难度区间，按 Latex 表达式长度计，左闭右开
+HISTORY = "history.sqlite3"  # 已发放题目的记录，新试卷不会重复其中的题目
+BASES = (2, 3, 4, 5, 10, 'e')  # gen_ans 可选的底数
+
+
+def gen_ans(rng: Random | None = None, bases: Sequence[int | str] = BASES) -> tuple[expr.Node, int]:
+    # 生成一个友好的单项式答案，底数从 bases 中选取
+    if rng is None:
+        rng = chaos.default_rng
+    base = rng.choice(bases)
+    exp = rng.randint(1, 4)
     
     if isinstance(base, str):
         if exp != 1:
@@ -17,8 +38,100 @@ def gen_ans() -> tuple[expr.Node, int]:
     
     return (expr.Log(expr.Value(base), arg_node), exp)
 
-def main() -> None:
-    print(r"""\documentclass[12pt]{article}
+
+def gen_problems(count: int, verifier: Verifier | None = None, rng: Random | None = None,
+                 band: tuple[int, int] | None = None, bases: Sequence[int | str] = BASES,
+                 space: "AnswerSpace | None" = None) -> list[Problem]:
+    """
+    生成 count 道复杂化后的候选题目
+    verifier: 若给出，复杂化时逐步检查改写，并一次性核对所有题目的值与答案，丢弃不符的题目，
+              因此返回的题目可能少于 count 道
+    rng: 随机数生成器，传入固定种子的 Random 即可复现结果
+    band: 若给出，用 chaos.make_targeted 把题目的 Latex 长度直接引导到 [lo, hi) 内，几乎不需要再筛选
+    bases: 答案中对数的底数，见 gen_ans
+    space: 若给出，一次性从这个答案空间中抽取全部初始题目（见 answers.py），不再调用 gen_ans，bases 不起作用
+    """
+    seeds = space.sample(rng, count) if space is not None else None
+    problems = []
+    for i in range(count):
+        node, ans = seeds[i] if seeds is not None else gen_ans(rng, bases)
+        if band is not None:
+            node = make_targeted(node, band, verifier=verifier, rng=rng)
+        else:
+            node = make_chaos(make_chaos(node, verifier=verifier, rng=rng), verifier=verifier, rng=rng)
+        problems.append((node, ans))
+    if verifier is not None:
+        problems = verifier.filter_answers(problems)
+    return problems
+
+
+def iter_problems(verifier: Verifier | None = None, batch_size: int = 256,
+                  rng: Random | None = None, band: tuple[int, int] | None = None,
+                  space: "AnswerSpace | None" = None) -> Iterator[Problem]:
+    """
+    源源不断地生成复杂化后的题目，只在被取用时才真正生成
+    verifier: 若给出，按 batch_size 一批生成并检查题目，见 gen_problems
+    band, space: 见 gen_problems
+    """
+    if verifier is None:
+        while True:
+            yield from gen_problems(1, rng=rng, band=band, space=space)
+
+    while True:
+        yield from gen_problems(batch_size, verifier, rng, band, space=space)
+
+
+def by_metric(name: str) -> Callable[[Problem], int]:
+    """以 expr.Metrics 中的某一项作为难度指标，无需渲染题目"""
+    return lambda problem: getattr(problem[0].metrics(), name)
+
+
+latex_len = by_metric("latex_len")  # 默认的难度指标：题目 Latex 表达式的长度
+
+
+def fill_bands(candidates: Iterable[Problem],
+               quotas: dict[tuple[int, int], int],
+               key: Callable[[Problem], int] = latex_len,
+               limit: int | None = None) -> dict[tuple[int, int], list[Problem]]:
+    """
+    把候选题目按难度分桶，每个区间 [lo, hi) 收满 quotas 中的数量后不再接收，
+    所有区间都收满时立即停止消费 candidates
+    limit: 最多检查的候选数量，超过仍未收满则抛出 RuntimeError
+    返回: {区间: 按难度升序排列的题目}
+    """
+    buckets: dict[tuple[int, int], list[tuple[int, int, Problem]]] = {band: [] for band in quotas}
+    missing = sum(quotas.values())
+    tried = 0
+
+    # 收满或达到 limit 后不再从 candidates 取下一道题，避免多生成一道
+    for problem in islice(candidates, limit) if missing > 0 else ():
+        tried += 1
+        k = key(problem)
+        for band, bucket in buckets.items():
+            lo, hi = band
+            if lo <= k < hi and len(bucket) < quotas[band]:
+                bucket.append((k, tried, problem))  # tried 保证同难度时按生成顺序排列
+                missing -= 1
+                break
+        if missing <= 0:
+            break
+
+    if missing > 0:
+        raise RuntimeError(f"Only {sum(quotas.values()) - missing} of {sum(quotas.values())} "
+                           f"problems fit the bands after {tried} candidates")
+
+    return {band: [p for _, _, p in sorted(bucket, key=lambda x: x[:2])]
+            for band, bucket in buckets.items()}
+
+
+def select_band(candidates: Iterable[Problem], count: int, band: tuple[int, int],
+                key: Callable[[Problem], int] = latex_len,
+                limit: int | None = None) -> list[Problem]:
+    """从候选题目中挑出 count 道难度落在 band 内的题目，凑满即停"""
+    return fill_bands(candidates, {band: count}, key, limit)[band]
+
+
+PREAMBLE = r"""\documentclass[12pt]{article}
 \usepackage[a4paper, margin=1in]{geometry}
 \usepackage{amsmath}
 \usepackage{ctex}
@@ -30,25 +143,111 @@ def main() -> None:
 
 \maketitle
 
-\begin{enumerate}""")
+\begin{enumerate}
+"""
+ENDING = r"""
+\end{enumerate}
 
-    n = 800
-    lis = [gen_ans() for _ in range(n)]
-    lis = [(f"\\item $ {make_chaos(make_chaos(expr))} = \\underline{{\\hspace{{2cm}}}} $", ans) for expr, ans in lis]
-    lis.sort(key = lambda x: len(x[0]))
+\end{document}
+"""
 
-    for item, _ in lis[(n - 150): (n - 50)]:
-        print(item)
-    
-    print("参考答案\n")
 
-    for i in range(n - 150, n - 50):
-        print(lis[i][1], end = ("; " if (i + 1) % 10 else "\n\n"))
+def pick_problems(index: DedupIndex, verify: bool = True, seed: int | None = None, workers: int = 1,
+                  bank: str | None = None, targeted: bool = False, space: "AnswerSpace | None" = None,
+                  count: int = COUNT, band: tuple[int, int] = BAND,
+                  executor: "Executor | None" = None) -> list[tuple[str, int]]:
+    """
+    选出一份试卷的 count 道难度在 band 内的题，跳过 index 中已有的题目并把选中的题目记为已发放，参数见 main
+    executor: workers > 1 时共用的进程池，见 parallel.iter_chunks
+    返回: [(Latex 表达式, 答案), ...]
+    """
+    if bank is not None:
+        import bank as problem_bank
+        with problem_bank.Bank(bank) as b:
+            records = b.sample(count, band, Random(seed) if seed is not None else None, exclude=index)
+        index.issue((r.key, r.latex) for r in records)
+        return [(r.latex, r.answer) for r in records]
+    elif seed is None and workers == 1:  # 不需要复现时直接使用默认随机数生成器
+        verifier = Verifier() if verify else None
+        if targeted:  # 几乎每道题都落在区间内，一批 count 道通常就够
+            candidates = iter_problems(verifier, count, band=band, space=space)
+        else:  # 约三成候选落在默认区间内，题目少时按需生成小批，不必每次生成 256 道
+            candidates = iter_problems(verifier, min(256, 4 * count), space=space)
+        problems = select_band(index.unique(candidates), count, band, limit=count * 100)
+        lis = [(str(node), ans) for node, ans in problems]
+        index.issue((canonical_key(node), latex) for (node, _), (latex, _) in zip(problems, lis))
+        return lis
+    else:
+        import parallel
+        return parallel.generate(count, band, seed, workers, verify, index=index, targeted=targeted, space=space,
+                                 executor=executor)
 
-    print(r"""
-\end{enumerate}
 
-\end{document}""")
+def answer_key(lis: list[tuple[str, int]]) -> str:
+    """答案区的文本，每行 10 个答案，以分号分隔"""
+    parts = []
+    for i, (_, ans) in enumerate(lis):
+        parts.append(str(ans))
+        parts.append("; " if (i + 1) % 10 else "\n\n")
+    return "".join(parts)
+
+
+def render(lis: list[tuple[str, int]]) -> str:
+    """一份完整的 Latex 试卷，答案附在题目之后"""
+    items = "".join(f"\\item $ {latex} = \\underline{{\\hspace{{2cm}}}} $\n" for latex, _ in lis)
+    return "".join((PREAMBLE, items, "参考答案\n\n", answer_key(lis), ENDING))
+
+
+def main(verify: bool = True, seed: int | None = None, workers: int = 1,
+         history: str | None = HISTORY, bank: str | None = None, targeted: bool = False,
+         space: "AnswerSpace | None" = None, count: int = COUNT, band: tuple[int, int] = BAND,
+         output: str | None = None) -> None:
+    """
+    输出一份完整的 Latex 试卷
+    verify: 是否只保留通过正确性检查的题目
+    seed: 若给出，试卷由种子唯一确定（在 history 相同时），与 workers 无关
+    workers: 生成题目所用的进程数
+    history: 已发放题目的记录文件，为 None 时只在本份试卷内去重
+    bank: 若给出，直接从该题库文件中抽题（见 bank.py），不再现场生成；verify 和 workers 不起作用
+    targeted: 定向生成难度落在 BAND 内的题目（见 chaos.make_targeted），不再大量生成后筛选
+    space: 初始题目的答案空间（见 answers.AnswerSpace），默认使用 gen_ans；答案可能是分数
+    count, band: 题目数量和难度区间
+    output: 输出文件，为 None 时输出到标准输出
+    多份试卷见 output.py
+    """
+    with DedupIndex(history) as index:
+        lis = pick_problems(index, verify, seed, workers, bank, targeted, space, count, band)
+    text = render(lis)
+    if output is None:
+        sys.stdout.write(text)
+    else:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def _band(text: str) -> tuple[int, int]:
+    lo, hi = text.split("-")
+    return int(lo), int(hi)
+
 
 if __name__ == '__main__':
-    main()
+    # 用法: python -m main [-n 题数] [--band 130-210] [--seed 种子] [-o 输出文件]
+    # 只载入出一份试卷所需的模块；题库、多进程和答案空间都在用到时才载入
+    import argparse
+    parser = argparse.ArgumentParser(description="生成一份对数运算试卷")
+    parser.add_argument("-n", "--count", type=int, default=COUNT, help="题目数量")
+    parser.add_argument("--band", type=_band, default=BAND, help="难度区间 lo-hi，按 Latex 表达式长度计")
+    parser.add_argument("--seed", type=int, help="随机种子，给出时试卷可复现")
+    parser.add_argument("-o", "--output", help="输出文件，默认为标准输出")
+    parser.add_argument("--workers", type=int, default=1, help="生成题目所用的进程数")
+    parser.add_argument("--bank", help="从该题库文件中抽题")
+    parser.add_argument("--history", default=HISTORY, help="已发放题目的记录文件")
+    parser.add_argument("--no-history", action="store_true", help="不记录已发放的题目，只在本份试卷内去重")
+    parser.add_argument("--targeted", action="store_true", help="定向生成题目")
+    parser.add_argument("--answers", action="store_true", help="从答案空间中抽取初始题目，答案可能是分数")
+    parser.add_argument("--no-verify", action="store_true", help="不检查题目的正确性")
+    args = parser.parse_args()
+    if args.answers:
+        from answers import AnswerSpace
+    main(not args.no_verify, args.seed, args.workers, None if args.no_history else args.history, args.bank,
+         args.targeted, AnswerSpace() if args.answers else None, args.count, args.band, args.output)
@@ -0,0 +1,109 @@
+"""
+批量输出：一次生成多份试卷写入目录，每份有自己的种子和答案文件，可选并行调用 xelatex 编译
+
+目录结构:
+    sheet-0000.tex          试卷，格式与 main 的输出相同
+    sheet-0000.answers.txt  答案，每行 10 个，以分号分隔
+    manifest.json           总种子、各份试卷的种子和判重所用的 history
+各份试卷共用一个判重索引，第 k 份跳过前面各份已选的题目，因此单份试卷的种子不能单独复现它；
+复现时用同样的总种子、份数和 history（生成前的状态）重新生成整批
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+from dedup import DedupIndex
+import main
+import parallel
+
+BUFFER = 1 << 16  # 写文件的缓冲区大小；每份试卷都是一次性拼好后整块写入
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8", buffering=BUFFER) as f:
+        f.write(text)
+
+
+def compile_tex(path: str) -> subprocess.CompletedProcess:
+    """用 xelatex 把 path 编译为同目录下的 PDF"""
+    return subprocess.run(
+        ["xelatex", "-interaction=batchmode", "-halt-on-error",
+         "-output-directory", os.path.dirname(path) or ".", path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def write_batch(directory: str, count: int, seed: int | None = None, verify: bool = True, workers: int = 1,
+                history: str | None = main.HISTORY, bank: str | None = None, targeted: bool = False,
+                compile: bool = False, jobs: int | None = None) -> list[str]:
+    """
+    生成 count 份试卷写入 directory，第 k 份的种子为 parallel.chunk_seed(seed, k)
+    所有试卷共用一个判重索引，同一批中的试卷之间也不会出现重复的题目；第 k 份因此依赖前面各份，
+    只能用 seed 整批复现
+    verify, workers, history, bank, targeted: 见 main.main；workers > 1 时整批共用一个进程池
+    compile: 是否用 xelatex 编译；编译在线程池中进行，与后续试卷的生成重叠
+    jobs: 同时运行的 xelatex 数，默认为 CPU 数
+    返回: 各份试卷的 .tex 路径
+    """
+    if compile and shutil.which("xelatex") is None:
+        raise RuntimeError("xelatex not found in PATH")
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    os.makedirs(directory, exist_ok=True)
+
+    paths: list[str] = []
+    sheets = []
+    compiles: list[Future] = []
+    pool = ProcessPoolExecutor(workers) if workers > 1 and bank is None else None
+    try:
+        with DedupIndex(history) as index, ThreadPoolExecutor(jobs or os.cpu_count() or 1) as executor:
+            for k in range(count):
+                sheet_seed = parallel.chunk_seed(seed, k)
+                lis = main.pick_problems(index, verify, sheet_seed, workers, bank, targeted, executor=pool)
+                name = f"sheet-{k:04d}"
+                path = os.path.join(directory, name + ".tex")
+                _write(path, main.render(lis))
+                _write(os.path.join(directory, name + ".answers.txt"), main.answer_key(lis))
+                paths.append(path)
+                sheets.append({"name": name, "seed": sheet_seed})
+                if compile:
+                    compiles.append(executor.submit(compile_tex, path))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    manifest = {
+        "seed": seed,
+        "count": count,
+        "history": history,
+        # 试卷之间共用判重索引，单份的种子不能单独复现该份试卷
+        "reproduce": "regenerate the whole batch with the same seed, count and pre-run history",
+        "sheets": sheets,
+    }
+    _write(os.path.join(directory, "manifest.json"), json.dumps(manifest, indent=2))
+
+    failed = [path for path, future in zip(paths, compiles) if future.result().returncode != 0]
+    if failed:
+        raise RuntimeError(f"xelatex failed for {len(failed)} of {count} worksheets: {', '.join(failed)}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量生成对数运算试卷")
+    parser.add_argument("directory", help="输出目录")
+    parser.add_argument("count", type=int, help="试卷份数")
+    parser.add_argument("--seed", type=int, help="总种子，默认随机")
+    parser.add_argument("--workers", type=int, default=1, help="生成题目所用的进程数")
+    parser.add_argument("--bank", help="从该题库文件中抽题")
+    parser.add_argument("--history", default=main.HISTORY, help="已发放题目的记录文件")
+    parser.add_argument("--targeted", action="store_true", help="定向生成题目")
+    parser.add_argument("--compile", action="store_true", help="用 xelatex 编译")
+    parser.add_argument("--jobs", type=int, help="同时运行的 xelatex 数")
+    args = parser.parse_args()
+    paths = write_batch(args.directory, args.count, args.seed, workers=args.workers, history=args.history,
+                        bank=args.bank, targeted=args.targeted, compile=args.compile, jobs=args.jobs)
+    print(f"Wrote {len(paths)} worksheets to {args.directory}", file=sys.stderr)
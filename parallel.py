@@ -0,0 +1,126 @@
+"""多进程批量生成题目，结果只取决于主种子，与进程数无关"""
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+import random
+import sys
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
+from dedup import DedupIndex, canonical_key
+import main
+from verify import Verifier
+
+if TYPE_CHECKING:
+    from answers import AnswerSpace
+
+CHUNK = 256  # 每个任务生成的候选题目数量，改变它会改变同一种子的输出
+
+T = TypeVar("T")
+
+
+def chunk_seed(seed: int, index: int) -> int:
+    """由主种子推出第 index 块的种子"""
+    return random.Random(f"{seed}:{index}").getrandbits(64)
+
+
+Chunk = list[tuple[int, bytes, str, int]]
+
+
+def _generate_chunk(seed: int, size: int, band: tuple[int, int], verify: bool, targeted: bool = False,
+                    space: "AnswerSpace | None" = None) -> Chunk:
+    """
+    在子进程中生成一块题目，targeted 时定向生成，space 为答案空间，见 main.gen_problems
+    返回: 难度落在 band 内的 [(难度, 判重键, Latex 表达式, 答案), ...]，保持生成顺序
+    """
+    problems = main.gen_problems(size, Verifier() if verify else None, random.Random(seed),
+                                 band if targeted else None, space=space)
+    return [(k, canonical_key(node), str(node), ans) for node, ans in problems
+            if band[0] <= (k := main.latex_len((node, ans))) < band[1]]
+
+
+def needed_chunks(missing: int, produced: int, done: int) -> int:
+    """
+    还需要的块数估计：已有 done 块共收获 produced 项时按平均收获估计，
+    尚无结果时按每块 CHUNK 项全部可用再多估一块，以免首块不够时还要串行地再等一块
+    """
+    if missing <= 0:
+        return 0
+    if done == 0:
+        return -(-missing // CHUNK) + 1
+    if produced == 0:
+        return sys.maxsize
+    return -(-missing * done // produced)
+
+
+def iter_chunks(task: Callable[..., T], seed: int, args: tuple, workers: int, limit: int,
+                wanted: Callable[[], int] | None = None, executor: Executor | None = None) -> Iterator[T]:
+    """
+    依次执行 task(chunk_seed(seed, 块编号), *args)，按块编号顺序产出结果
+    多进程时最多 workers 个任务在途，task 须为模块级函数
+    wanted: 若给出，返回还需要的块数估计（见 needed_chunks），在途任务不超过这个数，
+            凑满后不会再有多余的块占用进程；未给出时总是保持 workers 个任务在途
+    executor: 若给出，在其中执行任务且用后不关闭，多次调用可共用一个进程池；否则每次新建一个
+    停止取用后取消尚未开始的任务，不等待正在计算的多余任务
+    """
+    if workers == 1:
+        for index in range(limit):
+            yield task(chunk_seed(seed, index), *args)
+        return
+
+    own = executor is None
+    if own:
+        executor = ProcessPoolExecutor(workers)
+    pending: deque[Future] = deque()
+    submitted = 0
+    try:
+        while submitted < limit or pending:
+            window = workers if wanted is None else max(1, min(workers, wanted()))
+            while submitted < limit and len(pending) < window:
+                pending.append(executor.submit(task, chunk_seed(seed, submitted), *args))
+                submitted += 1
+            yield pending.popleft().result()
+    finally:
+        if own:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+
+
+def generate(count: int, band: tuple[int, int], seed: int | None = None, workers: int = 1,
+             verify: bool = True, limit: int | None = None,
+             index: DedupIndex | None = None, targeted: bool = False,
+             space: "AnswerSpace | None" = None, executor: Executor | None = None) -> list[tuple[str, int]]:
+    """
+    用 workers 个进程生成 count 道难度落在 band 内的题目，按难度升序排列
+    各块按编号顺序合并，凑满即停，因此同一个 seed 的结果与 workers 无关
+    limit: 最多生成的块数，默认为 count 的 100 倍题目所需的块数
+    index: 判重索引，在合并时跳过重复的题目，选中的题目记为已发放；默认只在本次结果内去重
+    targeted: 定向生成题目（见 chaos.make_targeted），几乎每道候选题目都落在 band 内
+    space: 初始题目的答案空间，见 answers.AnswerSpace
+    executor: 共用的进程池，见 iter_chunks
+    返回: [(Latex 表达式, 答案), ...]
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    if limit is None:
+        limit = -(-count * 100 // CHUNK)
+
+    if index is None:
+        index = DedupIndex()
+
+    selected: Chunk = []
+    done = 0
+    wanted = lambda: needed_chunks(count - len(selected), len(selected), done)
+    for chunk in iter_chunks(_generate_chunk, seed, (CHUNK, band, verify, targeted, space), workers, limit, wanted,
+                             executor):
+        done += 1
+        selected.extend(p for p in chunk if index.add(p[1]))
+        if len(selected) >= count:
+            del selected[count:]
+            break
+    else:
+        raise RuntimeError(f"Only {len(selected)} of {count} problems fit the band {band} "
+                           f"after {limit} chunks")
+
+    selected.sort(key=lambda x: x[0])  # 稳定排序，同难度的题目保持合并顺序
+    index.issue((key, latex) for _, key, latex, _ in selected)
+    return [(latex, ans) for _, _, latex, ans in selected]
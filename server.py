@@ -0,0 +1,296 @@
+"""
+试卷服务：后台进程持续生成并检查题目，按 (难度区间, 底数集合) 存入有上限的题目池，
+请求直接从池中取题，渲染好的试卷按编号存入 LRU 缓存；课堂上的突发请求无需等待生成
+
+HTTP 接口（python server.py [端口]）:
+    GET /worksheet?band=130-210&bases=2,3,10&count=100&id=abc
+        一份 Latex 试卷；各参数均可省略，默认为 main 中的 BAND、BASES 和 COUNT
+        给出 id 时同一 id 和参数总是得到同一份试卷（在它被 LRU 淘汰之前）
+    GET /stats
+        各题目池的大小、等待的请求数和缓存命中情况，JSON 格式
+    无法凑满题目的请求（如难度区间无法达到）在超时或放弃后得到 503
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Generic, Hashable, Sequence, TypeVar
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import random
+import sys
+from dedup import DedupIndex, canonical_key
+import main
+from verify import Verifier
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+PoolKey = tuple[tuple[int, int], tuple[int | str, ...]]  # (难度区间, 底数集合)
+Entry = tuple[int, bytes, str, int]  # (难度, 判重键, Latex 表达式, 答案)
+
+BATCH = 64  # 后台每次生成的候选题目数
+MAX_EMPTY = 8  # 连续这么多批都没有难度合适的题目时放弃该题目池
+MAX_POOLS = 32  # 默认的题目池数量上限
+
+
+class LRU(Generic[K, V]):
+    """容量有限的缓存，满了以后淘汰最久未使用的项"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> V | None:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+def _produce(seed: int, size: int, band: tuple[int, int], bases: tuple[int | str, ...], verify: bool) -> list[Entry]:
+    """在子进程中定向生成一批题目，返回难度落在 band 内的 [(难度, 判重键, Latex 表达式, 答案), ...]"""
+    problems = main.gen_problems(size, Verifier() if verify else None, random.Random(seed), band, bases)
+    return [(k, canonical_key(node), str(node), ans) for node, ans in problems
+            if band[0] <= (k := main.latex_len((node, ans))) < band[1]]
+
+
+def pool_key(band: tuple[int, int] = main.BAND, bases: Sequence[int | str] = main.BASES) -> PoolKey:
+    """规范化的题目池键，底数去重并按 main.BASES 中的顺序排列"""
+    if not bases or any(b not in main.BASES for b in bases):
+        raise ValueError(f"Bases must be a non-empty subset of {main.BASES}: {tuple(bases)}")
+    bases = tuple(b for b in main.BASES if b in bases)
+    if not band[0] < band[1]:
+        raise ValueError(f"Empty band: {band}")
+    return band, bases
+
+
+class _Pool:
+    """一个题目池：池中的题目、唤醒等待者的条件、补满它的后台任务，以及后台任务失败的原因"""
+    __slots__ = ("entries", "condition", "task", "error", "waiting")
+
+    def __init__(self):
+        self.entries: deque[Entry] = deque()
+        self.condition = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+        self.error: BaseException | None = None
+        self.waiting = 0  # 正在 take 中等待的请求数，不为 0 的池不会被淘汰
+
+
+class WorksheetService:
+    """
+    可在 asyncio 中直接调用的试卷服务，每个题目池由一个后台任务补满
+    capacity: 每个题目池的容量，须不小于单份试卷的题目数
+    cache_size: LRU 中保存的试卷份数
+    executor: 生成题目所用的执行器，默认为单进程的 ProcessPoolExecutor
+    max_pools: 题目池数量的上限，满了以后淘汰最久未使用且无人等待的池
+    timeout: take 等待题目的最长秒数，为 None 时一直等待
+    题目在整个服务内判重，发出的题目不会再出现在其他试卷中
+    后台连续 MAX_EMPTY 批都没有可用的题目（如难度区间无法达到）或生成时出错时，该池失败，
+    等待它的请求收到异常；失败的池随后被移除，之后的请求会重新尝试
+    """
+
+    def __init__(self, capacity: int = 4 * main.COUNT, cache_size: int = 256, verify: bool = True,
+                 executor: Executor | None = None, max_pools: int = MAX_POOLS, timeout: float | None = 30.0):
+        self.capacity = capacity
+        self.verify = verify
+        self.max_pools = max_pools
+        self.timeout = timeout
+        self.cache: LRU[tuple, str] = LRU(cache_size)
+        self._executor = executor if executor is not None else ProcessPoolExecutor(1)
+        self._own_executor = executor is None
+        self._index = DedupIndex()
+        self._pools: OrderedDict[PoolKey, _Pool] = OrderedDict()  # 按最近使用的顺序排列
+
+    def warm(self, band: tuple[int, int] = main.BAND, bases: Sequence[int | str] = main.BASES) -> PoolKey:
+        """
+        登记一个题目池并启动补满它的后台任务，已登记时只把它记为最近使用
+        池的数量已达上限时淘汰最久未使用且无人等待的池，全都有人等待时抛出 RuntimeError
+        """
+        key = pool_key(band, bases)
+        if key in self._pools:
+            self._pools.move_to_end(key)
+            return key
+        if len(self._pools) >= self.max_pools:
+            idle = next((k for k, p in self._pools.items() if not p.waiting), None)
+            if idle is None:
+                raise RuntimeError(f"All {self.max_pools} problem pools are busy")
+            self._drop(idle)
+        pool = self._pools[key] = _Pool()
+        pool.task = asyncio.create_task(self._fill(key, pool))
+        return key
+
+    def _drop(self, key: PoolKey) -> None:
+        """移除一个题目池并停止它的后台任务；池中未发出的题目作废，不会再被选中"""
+        pool = self._pools.pop(key)
+        if pool.task is not None:
+            pool.task.cancel()
+
+    async def _fill(self, key: PoolKey, pool: _Pool) -> None:
+        condition = pool.condition
+        loop = asyncio.get_running_loop()
+        empty = 0
+        try:
+            while True:
+                async with condition:
+                    await condition.wait_for(lambda: len(pool.entries) < self.capacity)
+                batch = await loop.run_in_executor(self._executor, _produce, random.randrange(2 ** 63), BATCH,
+                                                   *key, self.verify)
+                async with condition:
+                    room = self.capacity - len(pool.entries)
+                    for p in batch:  # 只收到池满为止，多出的题目不记入判重索引，以后仍可能被选中
+                        if room <= 0:
+                            break
+                        if self._index.add(p[1]):
+                            pool.entries.append(p)
+                            room -= 1
+                    condition.notify_all()
+                empty = 0 if batch else empty + 1
+                if empty >= MAX_EMPTY:
+                    raise RuntimeError(f"No problems fit the band {key[0]} after {MAX_EMPTY} batches")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            pool.error = e
+            if self._pools.get(key) is pool:
+                del self._pools[key]
+            async with condition:
+                condition.notify_all()
+
+    async def take(self, count: int, band: tuple[int, int] = main.BAND,
+                   bases: Sequence[int | str] = main.BASES) -> list[tuple[str, int]]:
+        """
+        从题目池中取出 count 道题，按难度升序排列；池中不够时等待后台补充
+        等待超过 timeout 时抛出 TimeoutError，后台生成失败时抛出 RuntimeError
+        """
+        if count < 1:
+            raise ValueError(f"Count must be positive: {count}")
+        if count > self.capacity:
+            raise ValueError(f"Cannot take {count} problems from a pool of capacity {self.capacity}")
+        pool = self._pools[self.warm(band, bases)]
+        condition = pool.condition
+        pool.waiting += 1
+        try:
+            async with condition:
+                await asyncio.wait_for(condition.wait_for(lambda: pool.error is not None or len(pool.entries) >= count),
+                                       self.timeout)
+                if pool.error is not None:
+                    raise RuntimeError(f"Problem generation failed: {pool.error}") from pool.error
+                taken = [pool.entries.popleft() for _ in range(count)]
+                condition.notify_all()
+        except TimeoutError:
+            raise TimeoutError(f"Timed out after {self.timeout}s waiting for {count} problems") from None
+        finally:
+            pool.waiting -= 1
+        taken.sort(key=lambda p: p[0])
+        return [(latex, ans) for _, _, latex, ans in taken]
+
+    async def worksheet(self, count: int = main.COUNT, band: tuple[int, int] = main.BAND,
+                        bases: Sequence[int | str] = main.BASES, sheet_id: str | None = None) -> str:
+        """一份渲染好的 Latex 试卷；给出 sheet_id 时先查 LRU 缓存"""
+        cache_key = (sheet_id, count, pool_key(band, bases))
+        if sheet_id is not None and (text := self.cache.get(cache_key)) is not None:
+            return text
+        text = main.render(await self.take(count, band, bases))
+        if sheet_id is not None:
+            self.cache.put(cache_key, text)
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "pools": [{"band": band, "bases": bases, "size": len(pool.entries), "waiting": pool.waiting}
+                      for (band, bases), pool in self._pools.items()],
+            "cache": {"size": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses},
+        }
+
+    async def close(self) -> None:
+        tasks = [pool.task for pool in self._pools.values() if pool.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pools.clear()
+        if self._own_executor:
+            self._executor.shutdown(cancel_futures=True)
+
+
+def _parse_query(query: str) -> dict:
+    """把查询参数转换为 WorksheetService.worksheet 的关键字参数，参数错误时抛出 ValueError"""
+    params = {k: v[-1] for k, v in parse_qs(query).items()}
+    kwargs: dict = {}
+    if "band" in params:
+        lo, hi = params["band"].split("-")
+        kwargs["band"] = (int(lo), int(hi))
+    if "bases" in params:
+        kwargs["bases"] = [b if b == "e" else int(b) for b in params["bases"].split(",")]
+    if "count" in params:
+        kwargs["count"] = int(params["count"])
+    if "id" in params:
+        kwargs["sheet_id"] = params["id"]
+    return kwargs
+
+
+async def _respond(writer: asyncio.StreamWriter, status: str, body: str, content_type: str) -> None:
+    data = body.encode()
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                 f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    writer.close()
+
+
+async def _handle(service: WorksheetService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """只支持 GET 的最小 HTTP/1.1 处理"""
+    try:
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        while (await reader.readline()).strip():  # 跳过请求头
+            pass
+    except ValueError:
+        return await _respond(writer, "400 Bad Request", "Malformed request\n", "text/plain")
+    url = urlsplit(target)
+    if method != "GET":
+        return await _respond(writer, "405 Method Not Allowed", "Only GET is supported\n", "text/plain")
+    if url.path == "/stats":
+        return await _respond(writer, "200 OK", json.dumps(service.stats()), "application/json")
+    if url.path != "/worksheet":
+        return await _respond(writer, "404 Not Found", "Not found\n", "text/plain")
+    try:
+        kwargs = _parse_query(url.query)
+        text = await service.worksheet(**kwargs)
+    except ValueError as e:
+        return await _respond(writer, "400 Bad Request", f"{e}\n", "text/plain")
+    except (RuntimeError, TimeoutError) as e:
+        return await _respond(writer, "503 Service Unavailable", f"{e}\n", "text/plain")
+    await _respond(writer, "200 OK", text, "application/x-latex")
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8000, service: WorksheetService | None = None) -> None:
+    """在 host:port 上提供 HTTP 接口，直到被取消；默认预热 main 中的默认题目池"""
+    if service is None:
+        service = WorksheetService()
+    service.warm()
+    server = await asyncio.start_server(lambda r, w: _handle(service, r, w), host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    # 用法: python server.py [端口]
+    try:
+        asyncio.run(serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000))
+    except KeyboardInterrupt:
+        pass
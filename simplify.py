@@ -0,0 +1,391 @@
+"""
+化简：按规则撤销 chaos 中的复杂化变换，自动求出题目的答案并给出步骤
+
+自底向上处理每个节点：子节点化简完后，在本节点上尝试规则；
+规则命中时，把改写结果放回工作表继续化简，其中已经化简过的子树直接复用。
+每个节点的结果都被记住，共享的子树只处理一次，因此总耗时与树的大小大致成正比。
+"""
+from collections import ChainMap
+from fractions import Fraction
+from math import gcd
+from typing import Callable, NamedTuple
+import math
+import exact
+import expr
+from verify import safe_value
+
+MAX_STEPS = 10000       # 每次 simplify 改写次数的上限（另按树的大小放宽，见 STEPS_PER_NODE），防止规则意外地循环
+STEPS_PER_NODE = 4      # 树中每个节点额外允许的改写次数，大树不会因为总数上限而化简不完
+MAX_DENOMINATOR = 1000  # evaluate 只尝试分母不超过它的结果
+
+
+class Step(NamedTuple):
+    """化简的一步：把子表达式 before 改写为 after"""
+    rule: str
+    before: expr.Node
+    after: expr.Node
+
+    def __str__(self) -> str:
+        return f"{RULES[self.rule]}: {self.before} = {self.after}"
+
+
+Rule = Callable[[expr.Node], expr.Node | None]
+
+
+def _const(node: expr.Node) -> Fraction | None:
+    """node 为化简后的常数（整数或既约分数 p/q）时返回它的值"""
+    if isinstance(node, expr.Value):
+        return Fraction(node.value) if node.is_num() else None
+    if (isinstance(node, expr.Div) and isinstance(node.left, expr.Value) and isinstance(node.right, expr.Value)
+            and isinstance(node.left.value, int) and isinstance(node.right.value, int)
+            and node.right.value > 1 and gcd(node.left.value, node.right.value) == 1):
+        return Fraction(node.left.value, node.right.value)
+    return None
+
+
+def _num(c: Fraction) -> expr.Node:
+    """常数 c 的化简形式"""
+    if c.denominator == 1:
+        return expr.Value(c.numerator)
+    return expr.Div(expr.Value(c.numerator), expr.Value(c.denominator))
+
+
+def _same(a: expr.Node, b: expr.Node) -> bool:
+    """结构相同，比较缓存的 Latex 表达式"""
+    return a is b or str(a) == str(b)
+
+
+def _is(node: expr.Node, value: int) -> bool:
+    return _const(node) == value
+
+
+def _rational(node: expr.Node) -> Fraction | None:
+    value = node.exact()
+    return None if value is None else value.as_fraction()
+
+
+def _root(n: int, k: int) -> int | None:
+    """n 的 k 次方根，不是整数时返回 None"""
+    r = round(n ** (1 / k))
+    for c in (r - 1, r, r + 1):
+        if c >= 0 and c ** k == n:
+            return c
+    return None
+
+
+def _log(b: Fraction, a: Fraction) -> Fraction | None:
+    """log_b a，不是有理数时返回 None；比较质因数分解的指数向量"""
+    if b <= 0 or b == 1 or a <= 0:
+        return None
+    if a == 1:
+        return Fraction(0)
+    fb = exact.factor_fraction(b)
+    fa = exact.factor_fraction(a)
+    if fb is None or fa is None or fb.keys() != fa.keys():
+        return None
+    ratio = None
+    for p, e in fb.items():
+        r = Fraction(fa[p], e)
+        if ratio is not None and r != ratio:
+            return None
+        ratio = r
+    return ratio
+
+
+def _apply(node: expr.Node, a: Fraction, b: Fraction) -> Fraction | None:
+    """常数 a、b 之间按 node 的类型运算，结果不是有理数或无定义时返回 None"""
+    if isinstance(node, expr.Add):
+        return a + b
+    elif isinstance(node, expr.Sub):
+        return a - b
+    elif isinstance(node, expr.Mul):
+        return a * b
+    elif isinstance(node, expr.Div):
+        return a / b if b else None
+    elif isinstance(node, expr.Log):
+        return _log(a, b)
+    # Pow：只计算不太大的有理数次幂
+    if (a == 0 and b <= 0) or abs(b.numerator) > 64 or b.denominator > 64:
+        return None
+    if b.denominator > 1:
+        if a < 0:
+            return None
+        num, den = _root(a.numerator, b.denominator), _root(a.denominator, b.denominator)
+        if num is None or den is None:
+            return None
+        a = Fraction(num, den)
+    if max(a.numerator.bit_length(), a.denominator.bit_length()) * abs(b.numerator) > exact.MAX_BITS:
+        return None
+    return a ** b.numerator
+
+
+# ---- 规则：参数为子节点已化简的节点，命中时返回改写结果，否则返回 None ----
+
+def fold(node: expr.Node) -> expr.Node | None:
+    """两个常数之间的运算，包括能开尽的乘方和值为有理数的对数"""
+    a, b = _const(node.left), _const(node.right)
+    if a is None or b is None or _const(node) is not None:
+        return None
+    c = _apply(node, a, b)
+    return None if c is None else _num(c)
+
+
+def identity(node: expr.Node) -> expr.Node | None:
+    """x + 0、x - 0、x × 1、x ÷ 1、x ^ 1、0 × x、1 ^ x、x - x、x ÷ x"""
+    a, b = node.left, node.right
+    if isinstance(node, expr.Add):
+        return b if _is(a, 0) else a if _is(b, 0) else None
+    elif isinstance(node, expr.Sub):
+        return a if _is(b, 0) else expr.Value(0) if _same(a, b) else None
+    elif isinstance(node, expr.Mul):
+        if _is(a, 0) or _is(b, 0):
+            return expr.Value(0)
+        return b if _is(a, 1) else a if _is(b, 1) else None
+    elif isinstance(node, expr.Div):
+        return a if _is(b, 1) else expr.Value(1) if _same(a, b) and not _is(b, 0) else None
+    elif isinstance(node, expr.Pow):
+        return a if _is(b, 1) else expr.Value(1) if _is(a, 1) else None
+    return None
+
+
+def cancel(node: expr.Node) -> expr.Node | None:
+    """约去分子分母的公因式：(x c) / (y c) = x / y，(x c) / c = x，(x c + y c) / c = x + y"""
+    a, b = node.left, node.right
+    if isinstance(b, expr.Mul) and isinstance(a, expr.Mul):
+        for x, c in ((a.left, a.right), (a.right, a.left)):
+            for y, d in ((b.left, b.right), (b.right, b.left)):
+                if _same(c, d) and not _is(c, 0):
+                    return expr.Div(x, y)
+    if isinstance(a, expr.Mul) and not _is(b, 0):
+        if _same(a.right, b):
+            return a.left
+        if _same(a.left, b):
+            return a.right
+    if isinstance(a, (expr.Add, expr.Sub)) and not _is(b, 0):
+        parts = []
+        for term in (a.left, a.right):
+            if isinstance(term, expr.Mul) and _same(term.right, b):
+                parts.append(term.left)
+            elif isinstance(term, expr.Mul) and _same(term.left, b):
+                parts.append(term.right)
+            else:
+                return None
+        return a.base_type(*parts)
+    return None
+
+
+def log_of_base(node: expr.Node) -> expr.Node | None:
+    """log_a a = 1，log_a 1 = 0，log_a a^k = k"""
+    base, arg = node.left, node.right
+    if _same(base, arg):
+        return expr.Value(1)
+    if _is(arg, 1):
+        return expr.Value(0)
+    if isinstance(arg, expr.Pow) and _same(arg.left, base):
+        return arg.right
+    return None
+
+
+def log_power(node: expr.Node) -> expr.Node | None:
+    """log_a x^k = k log_a x"""
+    arg = node.right
+    if isinstance(arg, expr.Pow):
+        return expr.Mul(arg.right, expr.Log(node.left, arg.left))
+    return None
+
+
+def base_power(node: expr.Node) -> expr.Node | None:
+    """log_{a^k} x = (1 / k) log_a x"""
+    base = node.left
+    if isinstance(base, expr.Pow) and _const(base.right) not in (None, 0):
+        return expr.Mul(_num(1 / _const(base.right)), expr.Log(base.left, node.right))
+    return None
+
+
+def exp_log(node: expr.Node) -> expr.Node | None:
+    """a^{log_a x} = x，a^{k log_a x} = x^k"""
+    base, e = node.left, node.right
+    if isinstance(e, expr.Log) and _same(e.left, base):
+        return e.right
+    if isinstance(e, expr.Mul):
+        for k, log in ((e.left, e.right), (e.right, e.left)):
+            if isinstance(log, expr.Log) and _same(log.left, base):
+                return expr.Pow(log.right, k)
+    return None
+
+
+def log_product(node: expr.Node) -> expr.Node | None:
+    """log_a x + log_a y = log_a (x y)"""
+    a, b = node.left, node.right
+    if isinstance(a, expr.Log) and isinstance(b, expr.Log) and _same(a.left, b.left):
+        return expr.Log(a.left, expr.Mul(a.right, b.right))
+    return None
+
+
+def log_quotient(node: expr.Node) -> expr.Node | None:
+    """log_a x - log_a y = log_a (x / y)"""
+    a, b = node.left, node.right
+    if isinstance(a, expr.Log) and isinstance(b, expr.Log) and _same(a.left, b.left):
+        return expr.Log(a.left, expr.Div(a.right, b.right))
+    return None
+
+
+def change_of_base(node: expr.Node) -> expr.Node | None:
+    """log_c x / log_c a = log_a x"""
+    a, b = node.left, node.right
+    if isinstance(a, expr.Log) and isinstance(b, expr.Log) and _same(a.left, b.left):
+        return expr.Log(b.right, a.right)
+    return None
+
+
+def reciprocal(node: expr.Node) -> expr.Node | None:
+    """1 / log_a b = log_b a"""
+    if _is(node.left, 1) and isinstance(node.right, expr.Log):
+        return expr.Log(node.right.right, node.right.left)
+    return None
+
+
+def log_chain(node: expr.Node) -> expr.Node | None:
+    """log_a b × log_b c = log_a c"""
+    a, b = node.left, node.right
+    if isinstance(a, expr.Log) and isinstance(b, expr.Log):
+        if _same(a.right, b.left):
+            return expr.Log(a.left, b.right)
+        if _same(b.right, a.left):
+            return expr.Log(b.left, a.right)
+    return None
+
+
+def evaluate(node: expr.Node) -> expr.Node | None:
+    """
+    其余规则都不适用时精确计算，如 lg2 lg5 + lg^2 2 + lg5 = 1
+    精确计算代价较高，先用浮点值筛掉明显不是简单分数的式子，结果仍以精确计算为准
+    """
+    if _const(node) is not None:
+        return None
+    value = safe_value(node)
+    if value is None:
+        return None
+    guess = Fraction(value).limit_denominator(MAX_DENOMINATOR)
+    if not math.isclose(guess, value, rel_tol=1e-9, abs_tol=1e-12):
+        return None
+    c = _rational(node)
+    return None if c is None else _num(c)
+
+
+RULES: dict[str, str] = {  # 规则名 -> 步骤说明
+    "fold": "计算",
+    "identity": "恒等式",
+    "cancel": "约分",
+    "log_of_base": "对数的定义",
+    "log_power": "对数的幂法则",
+    "base_power": "底数的幂",
+    "exp_log": "对数恒等式",
+    "log_product": "对数的加法法则",
+    "log_quotient": "对数的减法法则",
+    "change_of_base": "换底公式",
+    "reciprocal": "倒数关系",
+    "log_chain": "换底公式的推论",
+    "evaluate": "精确计算",
+}
+
+_BY_TYPE: dict[type, list[Rule]] = {  # 按顺序尝试，先尝试能给出清晰步骤的规则
+    expr.Add: [fold, identity, log_product, evaluate],
+    expr.Sub: [fold, identity, log_quotient, evaluate],
+    expr.Mul: [fold, identity, log_chain, evaluate],
+    expr.Div: [fold, identity, change_of_base, reciprocal, cancel, evaluate],
+    expr.Pow: [fold, identity, exp_log, evaluate],
+    expr.Log: [fold, log_of_base, base_power, log_power, evaluate],
+}
+
+
+class Simplifier:
+    """
+    化简器，同一个化简器处理的多棵树共享已化简的结果
+    trace: 若给出，每一步改写都追加到其中
+    每次 simplify 有各自的改写次数上限；达到上限时返回未化简完的树，这次的结果不会被记住
+    steps: 最近一次 simplify 的改写次数；exhausted: 最近一次是否达到了上限
+    """
+
+    def __init__(self, trace: list[Step] | None = None):
+        self.trace = trace
+        self.steps = 0
+        self.exhausted = False
+        self._limit = MAX_STEPS
+        self._memo: dict[int, tuple[expr.Node, expr.Node]] = {}  # id(节点) -> (节点, 化简结果)，保存节点以固定 id
+
+    def _rewrite(self, node: expr.Node) -> expr.Node | None:
+        """在 node 顶层尝试一条规则，命中时返回改写结果（其中可能有待化简的新节点）"""
+        if self.steps >= self._limit:
+            self.exhausted = True
+            return None
+        for rule in _BY_TYPE.get(node.base_type, ()):  # Arena 视图等子类按其基类处理
+            result = rule(node)
+            if result is not None:
+                self.steps += 1
+                if self.trace is not None:
+                    self.trace.append(Step(rule.__name__, node, result))
+                return result
+        return None
+
+    def simplify(self, node: expr.Node) -> expr.Node:
+        """化简 node，返回新的树，node 本身不变"""
+        self.steps = 0
+        self.exhausted = False
+        self._limit = MAX_STEPS + STEPS_PER_NODE * node.metrics().nodes
+        memo = ChainMap({}, self._memo)  # 本次的结果先记在第一层，化简完才并入 _memo
+        stack: list[tuple[expr.Node, int, expr.Node | None]] = [(node, 0, None)]  # (节点, 状态, 改写结果)
+        while stack:
+            n, state, target = stack.pop()
+            if state == 2:  # n 已被改写为 target，target 化简完毕
+                memo[id(n)] = (n, memo[id(target)][1])
+                continue
+            if id(n) in memo:
+                continue
+            if state == 0 and isinstance(n, expr.BinOp):
+                stack.append((n, 1, None))
+                for child in (n.right, n.left):
+                    if id(child) not in memo:
+                        stack.append((child, 0, None))
+                continue
+
+            current = n
+            if isinstance(n, expr.BinOp):
+                left, right = memo[id(n.left)][1], memo[id(n.right)][1]
+                if left is not n.left or right is not n.right:
+                    current = n.with_children(left, right)
+            result = self._rewrite(current)
+            if result is None:
+                memo[id(n)] = (n, current)
+                memo[id(current)] = (current, current)
+            else:
+                stack.append((n, 2, result))
+                stack.append((result, 0, None))
+        if not self.exhausted:
+            self._memo.update(memo.maps[0])
+        return memo[id(node)][1]
+
+
+def simplify(node: expr.Node, trace: list[Step] | None = None) -> expr.Node:
+    """化简 node，trace 若给出则记录每一步"""
+    return Simplifier(trace).simplify(node)
+
+
+def solve(node: expr.Node, trace: list[Step] | None = None) -> int | Fraction | None:
+    """化简 node 求出它的值，结果不是有理数时返回 None"""
+    c = _const(simplify(node, trace))
+    if c is None:
+        return None
+    return c.numerator if c.denominator == 1 else c
+
+
+if __name__ == "__main__":
+    import main
+    node, ans = main.gen_ans()
+    import chaos
+    problem = chaos.make_chaos(chaos.make_chaos(node))
+    steps: list[Step] = []
+    print(f"题目: {problem}")
+    print(f"答案: {solve(problem, steps)}（生成时记录的答案为 {ans}）")
+    for i, step in enumerate(steps, 1):
+        print(f"{i}. {step}")
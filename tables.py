@@ -0,0 +1,45 @@
+"""预计算表的磁盘缓存：首次构建后用 pickle 存入 __pycache__，之后的进程直接载入，省去构建和核对的时间"""
+from typing import Callable, Hashable, TypeVar
+import os
+import pickle
+
+T = TypeVar("T")
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+
+def source_key(module_file: str) -> tuple:
+    """模块源文件的版本标识，源文件被修改后缓存随之失效"""
+    st = os.stat(module_file)
+    return st.st_mtime_ns, st.st_size
+
+
+def sources_key(*module_files: str) -> tuple:
+    """构建一张表所用到的全部模块源文件的版本标识，其中任一文件被修改后缓存都随之失效"""
+    return tuple(source_key(f) for f in module_files)
+
+
+def cached(name: str, key: Hashable, build: Callable[[], T]) -> T:
+    """
+    载入名为 name、版本为 key 的缓存表，不存在、已过期或损坏时调用 build() 重建并写入
+    缓存目录不可写时只是不缓存
+    """
+    path = os.path.join(CACHE_DIR, f"{name}.table")
+    try:
+        with open(path, "rb") as f:
+            stored_key, value = pickle.load(f)
+        if stored_key == key:
+            return value
+    except Exception:  # 缓存文件不存在或损坏都直接重建
+        pass
+
+    value = build()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump((key, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return value
@@ -0,0 +1,39 @@
+"""answers：抽出的答案与题目的精确值、浮点值一致，按权重抽取，不合法的底数和指数被拒绝"""
+import math
+import random
+from collections import Counter
+from fractions import Fraction
+import pytest
+from answers import AnswerSpace
+from verify import safe_value
+
+
+def test_samples_match_exact_and_calc():
+    space = AnswerSpace()
+    assert len(space) > 50
+    for node, ans in space.sample(random.Random(1), k=500):
+        assert node.exact() == ans, str(node)
+        assert math.isclose(safe_value(node), ans, rel_tol=1e-12, abs_tol=1e-12), str(node)
+    answers = {ans for _, ans in space.table}
+    assert {-3, Fraction(3, 2), Fraction(-1, 2)} <= answers
+
+
+def test_weights_are_respected():
+    space = AnswerSpace(bases=(2, 3, "e"), exponents=(1, 2), weight=lambda base, ans: 0 if base == "e" else ans)
+    counts = Counter((node.left.value, ans) for node, ans in space.sample(random.Random(2), k=6000))
+    assert set(counts) == {(2, 1), (2, 2), (3, 1), (3, 2)}
+    for base in (2, 3):
+        assert 1.7 < counts[base, 2] / counts[base, 1] < 2.3  # 权重之比为 2
+
+
+def test_invalid_arguments():
+    for bases in ((1,), (0,), (-2,), (2.0,), ("x",), (True,)):
+        with pytest.raises(ValueError, match="Invalid base"):
+            AnswerSpace(bases=bases)
+    for exponents in ((0.5,), ("1",), (float("nan"),), (False,)):
+        with pytest.raises(ValueError, match="Invalid exponent"):
+            AnswerSpace(exponents=exponents)
+    with pytest.raises(ValueError, match="Empty answer space"):
+        AnswerSpace(bases=(2,), exponents=(Fraction(1, 7),))
+    with pytest.raises(ValueError, match="Empty answer space"):
+        AnswerSpace(weight=lambda base, ans: 0)
@@ -0,0 +1,69 @@
+"""arena：视图与普通节点等价，可以直接交给改写、化简、收录和编码"""
+import random
+import pytest
+import arena
+import chaos
+import codec
+import main
+import simplify
+from dedup import canonical_key
+from expr import Add, Interner, Log, Value
+from verify import Verifier, safe_value
+
+
+def _problems(count=30, seed=1):
+    return main.gen_problems(count, Verifier(), random.Random(seed))
+
+
+def test_view_matches_node():
+    problems = _problems()
+    pool = arena.Arena(node for node, _ in problems)
+    for k, (node, _) in enumerate(problems):
+        view = pool.view(k)
+        assert str(view) == str(node)
+        assert view.metrics() == node.metrics()
+        assert safe_value(view) == safe_value(node)
+        assert str(pool.to_node(k)) == str(node)
+
+
+def test_with_children_on_view_builds_plain_node():
+    pool = arena.Arena([Add(Log(Value(2), Value(8)), Value(1))])
+    view = pool.view(0)
+    new = view.with_children(view.left, Value(2))
+    assert type(new) is Add
+    assert str(new) == "\\log_{2}{8} + 2" and new.calc() == 5.0
+
+
+def test_rewrite_views():
+    problems = _problems()
+    pool = arena.Arena(node for node, _ in problems)
+    for k, (node, ans) in enumerate(problems):
+        view = pool.view(k)
+        rewritten = chaos.make_chaos(view, rng=random.Random(k))
+        assert str(rewritten)
+        assert str(Interner().intern(view)) == str(node)
+        assert canonical_key(view) == canonical_key(node)
+        assert codec.dumps(view) == codec.dumps(node)
+        assert str(arena.Arena([view]).view(0)) == str(node)
+        solved = simplify.solve(view)
+        assert solved is None or solved == ans
+
+
+def test_batch_evaluates_views():
+    batch = pytest.importorskip("batch")
+    problems = _problems()
+    pool = arena.Arena(node for node, _ in problems)
+    values, errors = batch.evaluate_many(list(pool))
+    assert not errors.any()
+    assert all(abs(v - ans) < 1e-9 for v, (_, ans) in zip(values.tolist(), problems))
+
+
+def test_big_ints_round_trip():
+    values = [2 ** 63 - 1, 2 ** 63, -(2 ** 63), -(2 ** 63) - 1, 10 ** 40, 0.5, "e"]
+    pool = arena.Arena(Add(Value(v), Value(1)) for v in values)
+    for k, v in enumerate(values):
+        assert pool.view(k).left.value == v and type(pool.view(k).left.value) is type(v)
+        assert pool.to_node(k).left.value == v
+    big = pool.view(4)
+    assert str(big) == str(Add(Value(10 ** 40), Value(1)))
+    assert codec.dumps(big) == codec.dumps(pool.to_node(4))
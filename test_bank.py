@@ -0,0 +1,53 @@
+"""bank：题库写入后重新打开，按难度区间抽出的题目与写入时一致，排除和数量不足的情况"""
+import math
+import random
+import pytest
+import bank
+from dedup import DedupIndex
+from verify import safe_value
+
+BAND = (130, 210)
+
+
+@pytest.fixture(scope="module")
+def path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("bank") / "problems.bank")
+    assert bank.build(path, 300, seed=7) == 300
+    return path
+
+
+def test_sample_round_trip(path):
+    with bank.Bank(path) as b:
+        assert len(b) == 300
+        ids = b.band(BAND)
+        assert len(ids) >= 40
+        records = b.sample(40, BAND, random.Random(1))
+        assert len({r.key for r in records}) == 40
+        lens = [r.metrics.latex_len for r in records]
+        assert lens == sorted(lens) and all(BAND[0] <= n < BAND[1] for n in lens)
+        for r in records:
+            node = r.node()
+            assert str(node) == r.latex and len(r.latex) == r.metrics.latex_len
+            assert node.metrics() == r.metrics
+            assert math.isclose(safe_value(node), r.answer, rel_tol=1e-9, abs_tol=1e-9), r.latex
+        assert [r.latex for r in b.sample(40, BAND, random.Random(1))] == [r.latex for r in records]
+
+
+def test_sample_excludes_issued(path):
+    with bank.Bank(path) as b, DedupIndex() as issued:
+        total = len(b.band(BAND))
+        first = b.sample(total // 2, BAND, random.Random(2))
+        issued.issue((r.key, r.latex) for r in first)
+        second = b.sample(total - len(first), BAND, random.Random(3), exclude=issued)
+        assert not {r.key for r in first} & {r.key for r in second}
+        with pytest.raises(RuntimeError):
+            b.sample(1, BAND, random.Random(4), exclude={r.key for r in first + second})
+
+
+def test_band_too_small(path):
+    with bank.Bank(path) as b:
+        available = len(b.band(BAND))
+        with pytest.raises(RuntimeError, match=f"Only {available} of {available + 1}"):
+            b.sample(available + 1, BAND, random.Random(5))
+        with pytest.raises(RuntimeError):
+            b.sample(1, (1, 5), random.Random(5))
@@ -0,0 +1,47 @@
+"""batch 的向量化求值与 Node.calc() / verify.safe_value 一致"""
+import math
+import pytest
+from expr import Add, Div, Log, Mul, Pow, Sub, Value
+from verify import Verifier, safe_value
+
+np = pytest.importorskip("numpy")
+import batch  # noqa: E402
+
+V = Value
+HUGE = Pow(V(10), V(400))  # calc() 抛出 OverflowError
+
+CASES = [
+    Add(Log(V(2), V(8)), V(1)),
+    Div(Log(V(2), V(9)), Log(V(2), V(3))),
+    Pow(V("e"), Log(V("e"), V(5))),
+    Sub(V(1), Mul(V(2), V(3))),
+    Div(V(1), V(0)),
+    Log(V(1), V(5)),
+    Log(V(2), V(-4)),
+    Pow(V(-8), Div(V(1), V(3))),
+    Pow(V(0), V(-1)),
+    HUGE,
+    Div(V(1), HUGE),
+    Sub(HUGE, HUGE),
+    Log(V(10), HUGE),
+    Mul(V(0), HUGE),
+    V(7),
+]
+
+
+def test_matches_safe_value():
+    values, errors = batch.evaluate_many(CASES)
+    for node, value, error in zip(CASES, values.tolist(), errors.tolist()):
+        expected = safe_value(node)
+        assert error == (expected is None), str(node)
+        if expected is not None:
+            assert math.isclose(value, expected, rel_tol=1e-12), str(node)
+
+
+def test_check_answers_agrees_with_filter_answers():
+    problems = [(Div(V(1), HUGE), 0), (Add(Log(V(2), V(8)), V(1)), 4), (Mul(V(0), HUGE), 0),
+                (Pow(V(-8), Div(V(1), V(3))), 2), (Log(V(2), V(9)), 3)]
+    kept = Verifier().filter_answers(problems)
+    assert [str(n) for n, _ in kept] == ["\\log_{2}{8} + 1"]
+    ok = batch.check_answers([n for n, _ in problems], [ans for _, ans in problems]).tolist()
+    assert ok == [any(p is q for q in kept) for p in problems]
@@ -0,0 +1,80 @@
+"""chaos：嵌套的改写沿用调用者的策略表、检查器和收录表；定向复杂化落入难度区间且不改变值"""
+import random
+import chaos
+import main
+from expr import BinOp, Interner, Log, Value
+from verify import Verifier, safe_value
+
+
+def _only_double_change() -> chaos.StrategyRegistry:
+    registry = chaos.DEFAULT_REGISTRY.copy()
+    registry.configure({name: 0 for name in registry._strategies if name != "_apply_double_change_of_base"})
+    return registry
+
+
+def _nodes(root):
+    stack = [root]
+    while stack:
+        n = stack.pop()
+        yield n
+        if isinstance(n, BinOp):
+            stack += [n.left, n.right]
+
+
+def test_nested_make_chaos_uses_callers_registry():
+    registry = _only_double_change()
+    chaos.DEFAULT_REGISTRY.reset_stats()
+    with chaos.profile(registry) as profiler:
+        for seed in range(20):
+            chaos.make_chaos(Log(Value(2), Value(8)), rng=random.Random(seed), registry=registry)
+    assert not chaos.DEFAULT_REGISTRY.stats
+    assert set(registry.stats) == {"_apply_double_change_of_base"}
+    assert profiler.by_strategy()["_apply_double_change_of_base"]["calls"] == \
+        registry.stats["_apply_double_change_of_base"]["effective"]
+
+
+def test_make_targeted_uses_callers_registry():
+    registry = _only_double_change()
+    chaos.DEFAULT_REGISTRY.reset_stats()
+    node = chaos.make_targeted(Log(Value(2), Value(8)), (60, 400), rng=random.Random(3), registry=registry)
+    assert node.metrics().latex_len >= 60
+    assert not chaos.DEFAULT_REGISTRY.stats and set(registry.stats) == {"_apply_double_change_of_base"}
+
+
+def test_nested_rewrites_are_verified_and_interned():
+    interner = Interner()
+    verifier = Verifier()
+    for seed in range(20):
+        node = chaos.make_chaos(Log(Value(2), Value(8)), rng=random.Random(seed), verifier=verifier,
+                                interner=interner)
+        assert abs(safe_value(node) - 3) < 1e-9
+        assert all(interner.owns(n) for n in _nodes(node))
+    assert verifier.stats
+
+
+def test_make_targeted_lands_in_band_and_keeps_value():
+    rng = random.Random(11)
+    verifier = Verifier()
+    landed = 0
+    for _ in range(100):
+        start, ans = main.gen_ans(rng)
+        text = str(start)
+        node = chaos.make_targeted(start, (130, 210), verifier=verifier, rng=rng)
+        n = node.metrics().latex_len
+        assert n < 210 and str(start) == text
+        landed += n >= 130
+        assert abs(safe_value(node) - ans) < 1e-9, str(node)
+    assert landed >= 95
+    assert sum(c["accepted"] for c in verifier.stats.values()) > 0
+
+
+def test_make_targeted_honours_verifier():
+    class RejectAll(Verifier):
+        def accept(self, name, before, after):
+            self.stats[name]["changed"] += 1
+            return False
+
+    verifier = RejectAll()
+    start = Log(Value(2), Value(8))
+    assert chaos.make_targeted(start, (130, 210), verifier=verifier, rng=random.Random(1), attempts=20) is start
+    assert sum(c["changed"] for c in verifier.stats.values()) > 0
@@ -0,0 +1,68 @@
+"""codec：varint 和树的编码都能原样解码"""
+import io
+import random
+import pytest
+import codec
+import main
+from answers import AnswerSpace
+from expr import Add, Div, Log, Pow, Sub, Value
+
+
+def _problems():
+    return main.gen_problems(100, None, random.Random(4)) + \
+        main.gen_problems(50, None, random.Random(5), space=AnswerSpace())
+
+
+def test_varint_round_trip():
+    for n in (0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 32, 2 ** 63 - 1, 2 ** 64 + 5, 10 ** 40):
+        out = bytearray(b"x")
+        codec.write_varint(out, n)
+        assert codec.read_varint(out, 1) == (n, len(out))
+    out = bytearray()
+    codec.write_varint(out, 127)
+    assert len(out) == 1
+    with pytest.raises(ValueError):
+        codec.read_varint(bytes([0x80, 0x80]), 0)
+
+
+def test_values_round_trip():
+    for value in (0, 1, 239, 240, 241, -1, -240, 2 ** 70, -(2 ** 70), 0.5, -1e300, "e", "pi"):
+        node = codec.loads(codec.dumps(Value(value)))
+        assert node.value == value and type(node.value) is type(value)
+
+
+def test_tree_round_trip():
+    for node, _ in _problems():
+        data = codec.dumps(node)
+        back = codec.loads(data)
+        assert codec.dumps(back) == data
+        assert str(back) == str(node)
+        assert back.metrics() == node.metrics()
+
+
+def test_concatenated_and_stream():
+    nodes = [node for node, _ in _problems()]
+    data = b"".join(codec.dumps(node) for node in nodes)
+    pos, back = 0, []
+    while pos < len(data):
+        node, pos = codec.decode(memoryview(data), pos)
+        back.append(node)
+    assert [str(n) for n in back] == [str(n) for n in nodes]
+
+    f = io.BytesIO()
+    with codec.Writer(f) as writer:
+        writer.write_many(nodes)
+    assert [str(n) for n in codec.iter_loads(f.getvalue())] == [str(n) for n in nodes]
+    f.seek(0)
+    assert [str(n) for n in codec.Reader(f)] == [str(n) for n in nodes]
+
+
+def test_malformed():
+    data = codec.dumps(Add(Log(Value(2), Value(8)), Sub(Div(Value(1), Value(3)), Pow(Value("e"), Value(2)))))
+    for cut in range(len(data)):
+        with pytest.raises(ValueError):
+            codec.loads(data[:cut])
+    with pytest.raises(ValueError):
+        codec.loads(data + b"\x10")
+    with pytest.raises(ValueError):
+        codec.loads(bytes([10]))
@@ -0,0 +1,60 @@
+"""dedup：只交换加法、乘法顺序的题目视为重复，值不同的题目不会误判，已发放记录可重新载入"""
+import random
+import main
+from dedup import DedupIndex, canonical_key
+from expr import Add, Div, Log, Mul, Pow, Sub, Value
+from verify import Verifier, safe_value
+
+V = Value
+
+
+def _lg(x):
+    return Log(V(10), V(x))
+
+
+def test_commutative_reorderings_share_a_key():
+    same = [
+        (Add(_lg(5), _lg(2)), Add(_lg(2), _lg(5))),
+        (Add(_lg(2), Add(_lg(5), V(0))), Add(_lg(5), _lg(2))),
+        (Mul(Log(V(2), V(9)), Log(V(3), V(8))), Mul(Log(V(3), V(8)), Log(V(2), V(9)))),
+        (Add(Mul(V(2), _lg(5)), Add(V(1), _lg(3))), Add(Add(_lg(3), V(1)), Mul(_lg(5), V(2)))),
+        (Log(Add(V(1), V(1)), V(8)), Log(V(2), V(8))),
+    ]
+    for a, b in same:
+        assert canonical_key(a) == canonical_key(b), (str(a), str(b))
+
+
+def test_different_problems_have_different_keys():
+    different = [
+        Sub(_lg(5), _lg(2)), Sub(_lg(2), _lg(5)),
+        Div(_lg(5), _lg(2)), Div(_lg(2), _lg(5)),
+        Pow(V(2), V(3)), Pow(V(3), V(2)),
+        Log(V(2), V(8)), Log(V(8), V(2)), V(3),
+        Add(_lg(2), _lg(5)), Mul(_lg(2), _lg(5)),
+    ]
+    keys = [canonical_key(node) for node in different]
+    assert len(set(keys)) == len(keys)
+
+    problems = main.gen_problems(200, Verifier(), random.Random(6))
+    values = {}
+    for node, _ in problems:  # 同一个键只能对应同一个值
+        values.setdefault(canonical_key(node), set()).add(round(safe_value(node), 9))
+    assert all(len(v) == 1 for v in values.values())
+
+
+def test_issued_keys_survive_reopening(tmp_path):
+    path = str(tmp_path / "issued.sqlite")
+    a, b, c = Add(_lg(5), _lg(2)), Log(V(2), V(8)), Sub(_lg(5), _lg(2))
+    with DedupIndex(path) as index:
+        assert index.add(canonical_key(a)) and not index.add(canonical_key(a))
+        index.issue([(canonical_key(a), str(a)), (canonical_key(b), str(b))])
+
+    with DedupIndex(path) as index:
+        assert len(index) == 2
+        assert canonical_key(Add(_lg(2), _lg(5))) in index and canonical_key(b) in index
+        assert canonical_key(c) not in index
+        assert [str(n) for n, _ in index.unique([(a, 1), (c, 0), (b, 3)])] == [str(c)]
+
+    with DedupIndex() as memory:  # 不指定文件时不保留
+        memory.issue([(canonical_key(a), str(a))])
+    assert canonical_key(a) not in DedupIndex()
@@ -0,0 +1,65 @@
+"""exact：精确值与浮点值一致，能精确计算的题目得到的正是答案"""
+import math
+import random
+from fractions import Fraction
+import exact
+import main
+from answers import AnswerSpace
+from exact import Exact
+from expr import Add, Div, Log, Mul, Pow, Sub, Value
+from verify import Verifier, exact_matches, safe_value
+
+V = Value
+
+
+def test_arithmetic():
+    a, b = Exact.number(Fraction(1, 3)), Exact.number(2)
+    assert a + b == Fraction(7, 3) and a - b == Fraction(-5, 3)
+    assert a * b == Fraction(2, 3) and a / b == Fraction(1, 6)
+    assert a ** -2 == 9
+    e = Exact.symbol(exact.E)
+    assert (e * e) / e == e and (e - e).is_zero()
+    assert e.as_fraction() is None and math.isclose(float(e), math.e)
+
+
+def test_ln_exp_log_power():
+    assert exact.log(Exact.number(2), Exact.number(8)) == 3
+    assert exact.log(Exact.number(4), Exact.number(8)) == Fraction(3, 2)
+    assert exact.log(Exact.number(2), Exact.number(Fraction(1, 8))) == -3
+    assert exact.log(Exact.number(1), Exact.number(5)) is None
+    assert exact.log(Exact.number(2), Exact.number(-4)) is None
+    assert exact.exp(exact.ln(Exact.number(12))) == 12
+    assert exact.power(Exact.number(8), Exact.number(Fraction(2, 3))) == 4
+    assert exact.power(Exact.number(2), Exact.number(Fraction(1, 2))) is None
+    assert exact.power(Exact.number(0), Exact.number(-1)) is None
+    assert exact.factor_fraction(Fraction(12, 35)) == {2: 2, 3: 1, 5: -1, 7: -1}
+
+
+def test_identities():
+    lg = lambda x: Log(V(10), V(x))
+    cases = [
+        (Add(Add(Mul(lg(2), lg(5)), Pow(lg(2), V(2))), lg(5)), 1),
+        (Pow(V(10), lg(3)), 3),
+        (Div(Log(V(3), V(8)), Log(V(3), V(2))), 3),
+        (Mul(Log(V(2), V(9)), Log(V(3), V(8))), 6),
+        (Log(V("e"), Pow(V("e"), Div(V(1), V(2)))), Fraction(1, 2)),
+        (Sub(Log(V(2), V(12)), Log(V(2), V(3))), 2),
+    ]
+    for node, ans in cases:
+        assert node.exact() == ans, str(node)
+    assert Log(V(10), Log(V(10), V(2))).exact() is None
+    assert Div(V(1), Sub(V(2), V(2))).exact() is None
+
+
+def test_exact_matches_calc_on_generated_problems():
+    problems = main.gen_problems(300, Verifier(), random.Random(2))
+    problems += main.gen_problems(200, Verifier(), random.Random(3), space=AnswerSpace())
+    exact_count = 0
+    for node, ans in problems:
+        value = node.exact()
+        if value is None:
+            continue
+        exact_count += 1
+        assert math.isclose(float(value), safe_value(node), rel_tol=1e-9, abs_tol=1e-9), str(node)
+        assert exact_matches(node, ans), str(node)
+    assert exact_count >= 0.8 * len(problems)  # 其余如 ln(lg 2) 超出精确表示的范围
@@ -0,0 +1,50 @@
+"""expr 节点的缓存与不可变性"""
+import pytest
+from expr import Add, Div, Interner, Log, Mul, Pow, Sub, Value
+
+
+def _tree():
+    return Add(Log(Value(2), Value(8)), Value(1))
+
+
+def test_children_are_read_only():
+    t = _tree()
+    assert t.calc() == 4.0
+    with pytest.raises(AttributeError):
+        t.left.right = Value(4)
+    with pytest.raises(AttributeError):
+        t.right.value = 2
+    assert t.calc() == 4.0
+
+
+def test_with_children_leaves_original_and_caches_intact():
+    t = _tree()
+    text, metrics = str(t), t.metrics()
+    u = t.with_children(t.left.with_children(Value(2), Value(4)), t.right)
+    assert u.calc() == 3.0
+    assert str(u) == "\\log_{2}{4} + 1"
+    assert (t.calc(), str(t), t.metrics()) == (4.0, text, metrics)
+
+
+def test_latex_len_matches_rendering():
+    for t in (_tree(), Sub(Value(1), Add(Value(2), Value(3))), Mul(Value(2), Div(Value(1), Value(3))),
+              Pow(Log(Value(10), Value(2)), Value(2)), Pow(Value("e"), Log(Value("e"), Value(5)))):
+        assert t.metrics().latex_len == len(str(t))
+
+
+def test_interner_shares_structure():
+    interner = Interner()
+    a = interner.intern(_tree())
+    b = interner.intern(_tree())
+    assert a is b and interner.owns(a)
+    assert a.left is interner.intern(Log(Value(2), Value(8)))
+
+
+def test_deep_tree_does_not_recurse():
+    t = Value(1)
+    for _ in range(5000):
+        t = Mul(Value(2), t)
+    node = Log(Value(2), t)
+    assert node.exact() == 5000
+    assert node.metrics().latex_len == len(str(node))
+    assert node.calc() == 5000.0
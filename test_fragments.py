@@ -0,0 +1,50 @@
+"""fragments：片段按精确值收录，数值不符的片段被拒绝；对数多项式的因子取自片段库"""
+import random
+from fractions import Fraction
+import pytest
+import chaos
+import fragments
+from expr import Add, Log, Mul, Value
+from verify import Verifier, safe_value
+
+
+def _lg(x):
+    return Log(Value(10), Value(x))
+
+
+def test_add_checks_value():
+    lib = fragments.FragmentLibrary()
+    node = lib.add(Add(_lg(2), _lg(5)), 1, fragments.LOG)
+    assert lib.fragments(1, fragments.LOG) == [node]
+    with pytest.raises(ValueError):
+        lib.add(Add(Log(Value(2), Value(5)), Log(Value(5), Value(2))), 1, fragments.LOG)  # 值约为 2.75
+    with pytest.raises(ValueError):
+        lib.add(Log(Value(2), Value(8)), Fraction(5, 2), fragments.LOG)
+    with pytest.raises(ValueError):
+        lib.add(Log(Value(10), _lg(2)), 1, fragments.LOG)  # 无法精确计算
+    assert not lib.has(Fraction(5, 2), fragments.LOG) and len(lib.entries()) == 1
+
+
+def test_default_library_round_trip():
+    lib = fragments.library()
+    for kind, value, _, node in lib.entries():
+        assert node.exact() == value, (kind, str(node))
+    back = fragments.FragmentLibrary.from_entries(lib.entries())
+    assert [(k, v, w, str(n)) for k, v, w, n in back.entries()] == \
+        [(k, v, w, str(n)) for k, v, w, n in lib.entries()]
+
+
+def test_polynomial_factor_comes_from_library():
+    factors = fragments.library().fragments(1, fragments.POLYNOMIAL_FACTOR)
+    assert [str(f) for f in factors] == [str(Add(_lg(2), _lg(5)))]
+    node = Add(Log(Value(2), Value(8)), Value(1))
+    changed = 0
+    for seed in range(100):
+        ctx = chaos.Context(random.Random(seed), Verifier(), chaos.DEFAULT_REGISTRY)
+        result = chaos._introduce_polynomial_log_forms(node, 0, 4, ctx)
+        if result is node:
+            continue
+        changed += 1
+        assert isinstance(result, Mul) and result.right is node and any(result.left is f for f in factors)
+        assert abs(safe_value(result) - 4) < 1e-12
+    assert changed > 0
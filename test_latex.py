@@ -0,0 +1,48 @@
+"""latex：解析 expr 输出的 Latex 表达式能还原出同样的表达式，试卷能读回题目和答案"""
+import math
+import random
+from fractions import Fraction
+import pytest
+import latex
+import main
+from answers import AnswerSpace
+from verify import Verifier, safe_value
+
+
+def _problems():
+    return main.gen_problems(150, Verifier(), random.Random(8)) + \
+        main.gen_problems(100, Verifier(), random.Random(9), space=AnswerSpace())
+
+
+def test_parse_round_trip():
+    for node, _ in _problems():
+        text = str(node)
+        parsed = latex.parse(text)
+        assert str(parsed) == text
+        assert parsed.metrics().latex_len == len(text)
+        assert math.isclose(safe_value(parsed), safe_value(node), rel_tol=1e-9, abs_tol=1e-9), text
+
+
+def test_parse_answer():
+    assert latex.parse_answer(" 3 ") == 3
+    assert latex.parse_answer("-3/2") == Fraction(-3, 2)
+    assert latex.parse_answer("\\frac{4}{6}") == Fraction(2, 3)
+    assert latex.parse_answer("\\log_{2}{8}") == 3
+    with pytest.raises(latex.ParseError):
+        latex.parse_answer("\\lg{3}")
+
+
+def test_parse_errors():
+    for text in ("", "1 +", "\\frac{1}", "\\left(1", "1 $ 2", "{2} ^"):
+        with pytest.raises(latex.ParseError):
+            latex.parse(text)
+
+
+def test_worksheet_round_trip():
+    sheets = []
+    for seed in (1, 2):
+        problems = main.gen_problems(23, Verifier(), random.Random(seed), space=AnswerSpace())
+        sheets.append([(str(node), ans) for node, ans in problems])
+    text = "".join(main.render(lis) for lis in sheets)
+    back = list(latex.iter_problems(text.splitlines()))
+    assert [(str(node), ans) for node, ans in back] == [p for lis in sheets for p in lis]
@@ -0,0 +1,42 @@
+"""main：按难度区间分桶收题，收满即停止消费候选，超过检查上限时报错"""
+import random
+import pytest
+import main
+from verify import Verifier
+
+
+def _counting(values, consumed):
+    for v in values:
+        consumed.append(v)
+        yield v
+
+
+def test_fill_bands_quotas():
+    quotas = {(0, 10): 2, (10, 20): 3, (20, 30): 1}
+    values = [25, 3, 15, 27, 11, 5, 8, 19, 40, 12, 13]
+    got = main.fill_bands(values, quotas, key=lambda v: v)
+    assert got == {(0, 10): [3, 5], (10, 20): [11, 15, 19], (20, 30): [25]}
+
+
+def test_fill_bands_stops_when_full():
+    consumed = []
+    got = main.fill_bands(_counting(list(range(100)), consumed), {(5, 8): 2, (1, 3): 1}, key=lambda v: v)
+    assert got == {(5, 8): [5, 6], (1, 3): [1]}
+    assert consumed == list(range(7))
+
+
+def test_fill_bands_limit():
+    consumed = []
+    with pytest.raises(RuntimeError, match="Only 1 of 2 problems fit the bands after 5 candidates"):
+        main.fill_bands(_counting([1] * 100, consumed), {(0, 5): 1, (5, 10): 1}, key=lambda v: v, limit=5)
+    assert len(consumed) == 5
+    with pytest.raises(RuntimeError):
+        main.fill_bands(iter([1, 2]), {(0, 5): 3}, key=lambda v: v)
+
+
+def test_fill_bands_on_problems():
+    problems = main.iter_problems(Verifier(), rng=random.Random(3))
+    band = (130, 210)
+    got = main.fill_bands(problems, {band: 10}, limit=5000)[band]
+    lens = [len(str(node)) for node, _ in got]
+    assert len(got) == 10 and lens == sorted(lens) and all(band[0] <= n < band[1] for n in lens)
@@ -0,0 +1,24 @@
+"""output：整批共用一个进程池，结果与进程数无关"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+import output
+
+
+def test_batch_shares_one_pool(tmp_path, monkeypatch):
+    pools = []
+    init = ProcessPoolExecutor.__init__
+
+    def counting_init(self, *args, **kwargs):
+        pools.append(self)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(ProcessPoolExecutor, "__init__", counting_init)
+    many = output.write_batch(str(tmp_path / "many"), 3, seed=5, workers=2, history=None)
+    assert len(pools) == 1
+    one = output.write_batch(str(tmp_path / "one"), 3, seed=5, workers=1, history=None)
+    assert [open(p, encoding="utf-8").read() for p in many] == [open(p, encoding="utf-8").read() for p in one]
+
+    with open(tmp_path / "many" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["seed"] == 5 and manifest["count"] == 3 and manifest["history"] is None
+    assert [s["name"] for s in manifest["sheets"]] == ["sheet-0000", "sheet-0001", "sheet-0002"]
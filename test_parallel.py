@@ -0,0 +1,15 @@
+"""parallel：结果只取决于种子，在途的块数随需要调整"""
+import parallel
+
+
+def test_needed_chunks():
+    assert parallel.needed_chunks(0, 50, 2) == 0
+    assert parallel.needed_chunks(100, 0, 0) == 2
+    assert parallel.needed_chunks(30, 70, 1) == 1
+    assert parallel.needed_chunks(150, 50, 1) == 3
+
+
+def test_generate_independent_of_workers():
+    one = parallel.generate(40, (130, 210), seed=11, workers=1)
+    two = parallel.generate(40, (130, 210), seed=11, workers=2)
+    assert len(one) == 40 and one == two
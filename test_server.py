@@ -0,0 +1,80 @@
+"""server：题目池不超出容量，生成失败和超时传给请求，池的数量有上限"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import server
+
+
+def _run(coro_fn, **kwargs):
+    async def go():
+        service = server.WorksheetService(executor=ThreadPoolExecutor(1), **kwargs)
+        try:
+            return await coro_fn(service)
+        finally:
+            await service.close()
+    return asyncio.run(go())
+
+
+def test_take_and_capacity():
+    async def go(service):
+        taken = await service.take(10)
+        await asyncio.sleep(2)
+        return taken, service.stats()["pools"][0]["size"]
+
+    taken, size = _run(go, capacity=30)
+    assert len(taken) == 10 and [len(t) for t in taken] == [2] * 10
+    assert size <= 30
+
+
+def test_unreachable_band_fails():
+    async def go(service):
+        with pytest.raises(RuntimeError):
+            await service.take(5, band=(1, 5))
+        return service.stats()["pools"]
+
+    assert _run(go, timeout=30) == []
+
+
+def test_producer_error_reaches_take(monkeypatch):
+    def broken(*args):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(server, "_produce", broken)
+
+    async def go(service):
+        with pytest.raises(RuntimeError, match="boom"):
+            await service.take(5)
+
+    _run(go, timeout=30)
+
+
+def test_timeout(monkeypatch):
+    def slow(*args):
+        time.sleep(0.5)
+        return []
+
+    monkeypatch.setattr(server, "_produce", slow)
+
+    async def go(service):
+        with pytest.raises(TimeoutError):
+            await service.take(5)
+
+    _run(go, timeout=0.1)
+
+
+def test_pool_limit_evicts_idle():
+    async def go(service):
+        service.warm((100, 150))
+        service.warm((150, 200))
+        service.warm((200, 250))
+        return [p["band"] for p in service.stats()["pools"]]
+
+    assert _run(go, max_pools=2) == [(150, 200), (200, 250)]
+
+
+def test_parse_query():
+    assert server._parse_query("band=1-5&bases=2,e&count=3&id=x") == \
+        {"band": (1, 5), "bases": [2, "e"], "count": 3, "sheet_id": "x"}
+    with pytest.raises(ValueError):
+        server._parse_query("band=oops")
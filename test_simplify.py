@@ -0,0 +1,63 @@
+"""simplify：化简得到的答案与生成时的答案一致，改写次数上限按每次调用计算"""
+import random
+from fractions import Fraction
+import main
+import simplify
+from answers import AnswerSpace
+from expr import Add, Div, Log, Mul, Pow, Value
+from verify import Verifier
+
+V = Value
+
+
+def _problems(count, seed, space=None):
+    return main.gen_problems(count, Verifier(), random.Random(seed), space=space)
+
+
+def test_rules():
+    cases = [
+        (Log(V(2), V(8)), 3),
+        (Add(Log(V(10), V(5)), Log(V(10), V(2))), 1),
+        (Div(Log(V(3), V(8)), Log(V(3), V(2))), 3),
+        (Pow(V(2), Log(V(2), V(7))), 7),
+        (Mul(Log(V(2), V(9)), Log(V(3), V(8))), 6),
+        (Log(V(4), V(8)), Fraction(3, 2)),
+        (Log(V(2), Div(V(1), V(8))), -3),
+    ]
+    for node, ans in cases:
+        steps = []
+        assert simplify.solve(node, steps) == ans, str(node)
+        assert all(step.rule in simplify.RULES for step in steps)
+
+
+def test_solve_generated_problems():
+    problems = _problems(200, 5) + _problems(100, 6, AnswerSpace())
+    solved = [simplify.solve(node) for node, _ in problems]
+    assert all(s is None or s == ans for s, (_, ans) in zip(solved, problems))
+    assert sum(s is not None for s in solved) >= 0.9 * len(problems)
+
+
+def test_shared_simplifier_matches_fresh():
+    problems = _problems(300, 7)
+    shared = simplify.Simplifier()
+    for node, _ in problems:
+        assert str(shared.simplify(node)) == str(simplify.simplify(node))
+        assert not shared.exhausted
+
+
+def test_long_chain_within_budget():
+    node = V(1)
+    for _ in range(20000):
+        node = Add(node, V(1))
+    assert simplify.solve(node) == 20001
+
+
+def test_exhausted_result_not_memoized(monkeypatch):
+    node = Add(Add(Log(V(2), V(8)), Log(V(3), V(9))), Log(V(5), V(25)))
+    s = simplify.Simplifier()
+    monkeypatch.setattr(simplify, "MAX_STEPS", 1)
+    monkeypatch.setattr(simplify, "STEPS_PER_NODE", 0)
+    partial = s.simplify(node)
+    assert s.exhausted and simplify._const(partial) is None
+    monkeypatch.undo()
+    assert simplify._const(s.simplify(node)) == 7 and not s.exhausted
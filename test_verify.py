@@ -0,0 +1,18 @@
+"""verify：无法在实数范围内计算的改写被拒绝，而不是抛出异常"""
+from fractions import Fraction
+import pytest
+from expr import Log, Pow, Value
+from verify import Verifier, safe_value
+
+
+def test_complex_power_is_a_domain_error():
+    node = Log(Value(2), Pow(Value(-8), Value(Fraction(1, 3))))
+    with pytest.raises(ValueError):
+        node.calc()
+    assert safe_value(node) is None
+
+    verifier = Verifier()
+    assert not verifier.accept("root", 1.0, node)
+    assert verifier.stats["root"]["domain"] == 1
+    good = (Log(Value(2), Value(8)), 3)
+    assert verifier.filter_answers([(node, 1), good]) == [good]
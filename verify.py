@@ -0,0 +1,75 @@
+"""正确性检查：确认复杂化前后表达式的值不变"""
+from collections import Counter, defaultdict
+from fractions import Fraction
+from typing import Sequence
+import math
+import expr
+
+
+def safe_value(node: expr.Node) -> float | None:
+    """计算节点的值，遇到定义域错误、溢出或复数结果时返回 None"""
+    try:
+        value = node.calc()
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return None
+    if not math.isfinite(value):
+        return None
+    return value
+
+
+class Verifier:
+    """
+    检查每次改写是否保持表达式的值，并按策略统计结果
+    stats[策略名] 中的计数项:
+        accepted: 改写保持了值
+        changed: 改写改变了值，被拒绝
+        domain: 改写后无法计算（如底数为 1），被拒绝
+        unchecked: 改写前本身就无法计算，未检查
+    """
+
+    def __init__(self, rel_tol: float = 1e-9, abs_tol: float = 1e-9, retries: int = 3):
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.retries = retries  # 被拒绝后最多重新选择策略的次数
+        self.stats: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def close(self, a: float, b: float) -> bool:
+        return math.isclose(a, b, rel_tol=self.rel_tol, abs_tol=self.abs_tol)
+
+    def accept(self, name: str, before: float | None, after: expr.Node) -> bool:
+        """判断改写结果 after 能否替换值为 before 的原节点，并记录到 stats[name]"""
+        if before is None:
+            self.stats[name]["unchecked"] += 1
+            return True
+        value = safe_value(after)
+        if value is None:
+            self.stats[name]["domain"] += 1
+            return False
+        if not self.close(before, value):
+            self.stats[name]["changed"] += 1
+            return False
+        self.stats[name]["accepted"] += 1
+        return True
+
+    def filter_answers(self, problems: Sequence[tuple[expr.Node, int]]) -> list[tuple[expr.Node, int]]:
+        """
+        保留值与答案相符的题目，结果计入 stats["answer"]
+        逐题计算：bench.py 的 check_answers 基准中 batch.check_answers 在任何批量下都不更快
+        """
+        ok = [(v := safe_value(node)) is not None and self.close(v, ans) for node, ans in problems]
+        self.stats["answer"]["accepted"] += sum(ok)
+        self.stats["answer"]["changed"] += len(ok) - sum(ok)
+        return [p for p, good in zip(problems, ok) if good]
+
+    def report(self) -> str:
+        """各策略的统计结果，每行一个策略"""
+        return "\n".join(f"{name}: " + ", ".join(f"{k}={v}" for k, v in sorted(counter.items()))
+                         for name, counter in sorted(self.stats.items()))
+
+
+def exact_matches(node: expr.Node, ans: int | Fraction) -> bool | None:
+    """用精确值核对答案，无法精确计算时返回 None，由调用者退回浮点比较"""
+    value = node.exact()
+    if value is None:
+        return None
+    return value == ans